@@ -1,64 +1,141 @@
 import os
-import operator
-from typing import Annotated, Sequence, TypedDict, Any, Dict, Union, Literal
+import time
+import uuid
+import asyncio
+from typing import Annotated, Sequence, TypedDict, Any, Dict, Union, Literal, NamedTuple
 
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import BaseMessage, SystemMessage, AIMessage, ToolMessage, HumanMessage
+from langchain_core.utils.function_calling import convert_to_openai_tool
 from langgraph.graph.message import add_messages
 from langgraph.graph import StateGraph, START, END
 from dotenv import load_dotenv
 
-from utils import validate_arguments, configure_mcp
+from utils import validate_arguments, configure_mcp, build_tool_from_schema
+from llm_cache import LLMResponseCache, request_key
+from llm_client import ResilientInvoker, get_http_client, close_http_client
+from sharding import plan_shards, run_sharded, shard_concurrency
+from tracing import tracer_from_env
+from rescan import RescanStore, RESCAN_ENABLED, RESCAN_TOOLS
 
 load_dotenv()
 
+MAX_LOGS_PER_TURN = int(os.getenv("AGENT_MAX_LOGS_PER_TURN", "50"))
+
+# One store per process: last parsed scan and change timeline per (chat, tool, target)
+rescan_store = RescanStore()
+
+def add_logs(left: list, right: list) -> list:
+    """Append log lines, keeping only the newest MAX_LOGS_PER_TURN"""
+    return (left + right)[-MAX_LOGS_PER_TURN:]
+
+class TurnStats(NamedTuple):
+    """Per-turn budget counters"""
+    started: float = 0.0
+    steps: int = 0
+    tokens: int = 0
+    stop: str = ""
+
 class AgentState(TypedDict):
     
     messages: Annotated[Sequence[BaseMessage], add_messages]
     tool_called: str
     tool_args: Dict
     tool_call_id: str
-    tool_result: Any
-    logs: Annotated[list[str], operator.add]
+    tool_result_id: str  # tool_call_id of the latest ToolMessage; output lives only there
+    logs: Annotated[list[str], add_logs]
+    turn: TurnStats
+    chat_id: str  # scopes rescan baselines to one conversation
 
 class ReAct_Agent:
-    def __init__(self):
+    def __init__(self, max_tool_steps: int = None, max_turn_seconds: float = None, max_turn_tokens: int = None):
         self.stack = None
         self.GLOBAL_SCHEMA = {}
         self.GLOBAL_NAME_TO_TOOL = {}
         self.tools = []
         self.llm = None
         self.graph = None
+        self.model_params = {"model": "gpt-4o"}
+        self.tool_schemas = []
+        self.active_tools = None
+        self.api_key = None
+        self.api_base = None
+        self.response_cache = LLMResponseCache.from_env()
+        self.invoker = ResilientInvoker.from_env()
+        self.trace_mode, self.tracer = tracer_from_env()
+
+        # Per-turn budgets (0 disables a limit)
+        self.max_tool_steps = max_tool_steps if max_tool_steps is not None else int(os.getenv("AGENT_MAX_TOOL_STEPS", "8"))
+        self.max_turn_seconds = max_turn_seconds if max_turn_seconds is not None else float(os.getenv("AGENT_MAX_TURN_SECONDS", "100"))
+        self.max_turn_tokens = max_turn_tokens if max_turn_tokens is not None else int(os.getenv("AGENT_MAX_TURN_TOKENS", "60000"))
 
     async def setup(self, active_tools: list = None):
         """Initialize MCP stack and LLM with filtered tools"""
         api_key = os.getenv("OPEN_AI_API_KEY")
         api_base = os.getenv("OPEN_AI_API_BASE")
 
-        if not api_key:
+        if self.trace_mode == "replay":
+            # Offline run: tools come from the trace, responses are served by the TracePlayer
+            api_key = api_key or "replay"
+            self.tools = [
+                build_tool_from_schema(t["name"], t["description"], t["schema"], session=None)
+                for t in self.tracer.catalog
+            ]
+            self.GLOBAL_SCHEMA = {t["name"]: t["schema"] for t in self.tracer.catalog}
+            self.GLOBAL_NAME_TO_TOOL = {t.name: t for t in self.tools}
+        elif not api_key:
             raise ValueError("OPEN_AI_API_KEY not found in environment variables.")
+        else:
+            self.tools, self.GLOBAL_SCHEMA, self.GLOBAL_NAME_TO_TOOL, self.stack = await configure_mcp(
+                on_catalog_change=self._bind_tools
+            )
 
+        if self.trace_mode == "record":
+            self.tracer.record_catalog([
+                {"name": t.name, "description": t.description, "schema": self.GLOBAL_SCHEMA[t.name]}
+                for t in self.tools
+            ])
 
-        self.tools, self.GLOBAL_SCHEMA, self.GLOBAL_NAME_TO_TOOL, self.stack = await configure_mcp()
-        
+        self.active_tools = active_tools
+        self.api_key = api_key
+        self.api_base = api_base
+        self._bind_tools()
 
-        if active_tools is not None:
-            self.filtered_tools = [t for t in self.tools if t.name in active_tools]
+        self.graph = self._build_graph()
+
+    def _bind_tools(self):
+        """(Re)bind the LLM to the active tools; also called when the MCP catalog changes"""
+        if self.active_tools is not None:
+            self.filtered_tools = [t for t in self.tools if t.name in self.active_tools]
         else:
             self.filtered_tools = self.tools
 
+        self.tool_schemas = [convert_to_openai_tool(t) for t in self.filtered_tools]
 
         self.llm = ChatOpenAI(
-            model="gpt-4o", 
-            api_key=api_key,
-            base_url=api_base,
-        ).bind_tools(self.filtered_tools) 
+            **self.model_params,
+            api_key=self.api_key,
+            base_url=self.api_base,
+            http_async_client=get_http_client(),
+            max_retries=0,  # retries are handled by ResilientInvoker
+        ).bind_tools(self.filtered_tools)
 
-        self.graph = self._build_graph()
+    def _budget_exceeded(self, state: AgentState) -> str:
+        """Return which per-turn budget is used up, or an empty string"""
+        turn = state.get("turn") or TurnStats(started=time.monotonic())
+        if self.max_tool_steps and turn.steps >= self.max_tool_steps:
+            return f"tool step budget ({self.max_tool_steps} steps) was used up"
+        if self.max_turn_seconds and time.monotonic() - turn.started >= self.max_turn_seconds:
+            return f"time budget ({self.max_turn_seconds:.0f}s) was used up"
+        if self.max_turn_tokens and turn.tokens >= self.max_turn_tokens:
+            return f"token budget ({self.max_turn_tokens} tokens) was used up"
+        return ""
 
-    def should_continue(self, state: AgentState) -> Literal["tools", "end"]:
+    def should_continue(self, state: AgentState) -> Literal["tools", "budget", "end"]:
         last_message = state["messages"][-1]
         if isinstance(last_message, AIMessage) and last_message.tool_calls:
+            if self._budget_exceeded(state):
+                return "budget"
             return "tools"
         return "end"
 
@@ -72,10 +149,15 @@ class ReAct_Agent:
         )
         
         inputs = [sys_prompt] + list(state["messages"])
-        response = await self.llm.ainvoke(inputs)
+        response, billed = await self._invoke_llm(inputs)
 
+        # Cached responses keep the usage of the original call but cost nothing now
+        usage = (getattr(response, "usage_metadata", None) or {}) if billed else {}
         log_msg = "🤖 Agent is thinking..."
-        updates = {"messages": [response]}
+        updates = {
+            "messages": [response],
+            "turn": state["turn"]._replace(tokens=state["turn"].tokens + usage.get("total_tokens", 0)),
+        }
         
         if response.tool_calls:
             tc = response.tool_calls[0]
@@ -94,6 +176,70 @@ class ReAct_Agent:
             })
         return updates
 
+    async def _invoke_llm(self, inputs):
+        """Call the LLM, serving exact repeats from the response cache when enabled.
+
+        Returns (response, billed); billed is False for cache hits.
+        """
+        if self.response_cache is None and self.tracer is None:
+            return await self.invoker.ainvoke(self.llm, inputs), True
+
+        key = request_key(inputs, self.tool_schemas, self.model_params)
+        if self.trace_mode == "replay":
+            # Counted like the recorded call so token budget stops replay the same way
+            return self.tracer.model_response(key), True
+
+        started = time.perf_counter()
+        response = self.response_cache.get(key) if self.response_cache is not None else None
+        billed = response is None
+        if billed:
+            response = await self.invoker.ainvoke(self.llm, inputs)
+            if self.response_cache is not None:
+                self.response_cache.put(key, response)
+
+        if self.trace_mode == "record":
+            self.tracer.record_model(key, inputs, response, time.perf_counter() - started)
+        return response, billed
+
+    async def _invoke_tool(self, tool, tool_name: str, tool_args: Dict, state: AgentState):
+        """Run a tool (sharded when worthwhile) within the turn's time budget"""
+        if self.trace_mode == "replay":
+            return self.tracer.tool_result(tool_name, tool_args), []
+
+        started = time.perf_counter()
+        shards = plan_shards(tool_name, tool_args)
+
+        # Don't let a single tool run past the turn's time budget
+        remaining = None
+        if self.max_turn_seconds:
+            remaining = max(self.max_turn_seconds - (time.monotonic() - state["turn"].started), 1)
+
+        if shards:
+            # Finished shards are kept even when the budget runs out
+            result_text, shard_logs, complete = await run_sharded(
+                tool, shards, shard_concurrency(tool_name), timeout=remaining
+            )
+            shard_logs.insert(0, f"🧩 Split into {len(shards)} shards")
+        else:
+            try:
+                result_text = await asyncio.wait_for(tool.ainvoke(tool_args), timeout=remaining)
+            except asyncio.TimeoutError:
+                result_text = f"TOOL ERROR: {tool_name} stopped after {remaining:.0f}s (turn time budget)"
+            shard_logs = []
+            complete = not str(result_text).startswith("TOOL ERROR")
+
+        # A partial scan would show every missing port as closed and become the next baseline
+        if RESCAN_ENABLED and tool_name in RESCAN_TOOLS and complete:
+            delta_text = rescan_store.apply(state["chat_id"], tool_name, tool_args, result_text)
+            if delta_text is not None:
+                shard_logs.append(f"🔁 Rescan delta: {delta_text.splitlines()[0]}")
+                result_text = delta_text
+
+        # Record what the ToolMessage receives so replay sees the same conversation
+        if self.trace_mode == "record":
+            self.tracer.record_tool(tool_name, tool_args, result_text, time.perf_counter() - started)
+        return result_text, shard_logs
+
     async def tool_node(self, state: AgentState) -> Dict:
         tool_name = state["tool_called"]
         tool_args = state["tool_args"]
@@ -101,13 +247,15 @@ class ReAct_Agent:
 
         exec_log = f"🛠️ Executing {tool_name} with arguments: {tool_args}"
         
-        tool = self.GLOBAL_NAME_TO_TOOL[tool_name]
+        tool = self.GLOBAL_NAME_TO_TOOL.get(tool_name)
         
 
-        validation = validate_arguments(tool_args, self.GLOBAL_SCHEMA[tool_name])
+        # The MCP catalog can change under a running agent (see revalidate_tool_catalog)
+        validation = validate_arguments(tool_args, self.GLOBAL_SCHEMA[tool_name]) if tool else "Tool is no longer available"
+        shard_logs = []
         
         if validation == "Valid":
-            result_text = await tool.ainvoke(tool_args)
+            result_text, shard_logs = await self._invoke_tool(tool, tool_name, tool_args, state)
         else:
             result_text = f"Validation Error: {validation}"
         #print(result_text)
@@ -120,28 +268,89 @@ class ReAct_Agent:
         
         return {
             "messages": [tool_message],
-            "tool_result": result_text,
+            "tool_result_id": state["tool_call_id"],
             "tool_called": "",
             "tool_args": {},
             "tool_call_id": "",
-            "logs": [exec_log, f"✅ Tool Output: {str(result_text)[:150]}..."]
+            "turn": state["turn"]._replace(steps=state["turn"].steps + 1),
+            "logs": [exec_log] + shard_logs + [f"✅ Tool Output: {str(result_text)[:150]}..."]
         }
 
+    async def budget_node(self, state: AgentState) -> Dict:
+        """End the turn with a partial answer once a budget is used up"""
+        reason = self._budget_exceeded(state)
+        last_message = state["messages"][-1]
+
+        # Every requested tool call needs a reply or the next LLM request is rejected
+        skipped = [
+            ToolMessage(content=f"Skipped: {reason}.", tool_call_id=tc["id"], name=tc["name"])
+            for tc in last_message.tool_calls
+        ]
+
+        gathered = []
+        for message in reversed(state["messages"]):
+            if isinstance(message, HumanMessage):
+                break
+            if isinstance(message, ToolMessage):
+                gathered.append(f"- {message.name}: {str(message.content)[:500]}")
+        gathered.reverse()
+
+        summary = f"⚠️ I stopped before finishing because the {reason}."
+        if gathered:
+            summary += " Here is what was gathered so far:\n\n" + "\n".join(gathered)
+        else:
+            summary += " No tool output was gathered in this turn."
+
+        return {
+            "messages": skipped + [AIMessage(content=summary)],
+            "tool_called": "",
+            "tool_args": {},
+            "tool_call_id": "",
+            "turn": state["turn"]._replace(stop=reason),
+            "logs": [f"⏹️ Budget stop: {reason}"]
+        }
+
+    def budget_report(self, state: AgentState) -> Dict:
+        """How much of each per-turn budget was spent"""
+        turn = state["turn"]
+        return {
+            "tool_steps": turn.steps,
+            "max_tool_steps": self.max_tool_steps,
+            "seconds": round(time.monotonic() - turn.started, 2),
+            "max_seconds": self.max_turn_seconds,
+            "tokens": turn.tokens,
+            "max_tokens": self.max_turn_tokens,
+            "stopped": turn.stop or None,
+        }
+
+    @staticmethod
+    def tool_result(state: AgentState):
+        """Output of the latest tool call, read from its ToolMessage"""
+        result_id = state.get("tool_result_id")
+        if not result_id:
+            return None
+        for message in reversed(state["messages"]):
+            if isinstance(message, ToolMessage) and message.tool_call_id == result_id:
+                return message.content
+        return None
+
     def _build_graph(self):
         workflow = StateGraph(AgentState)
         workflow.add_node("reasoner", self.model_call)
         workflow.add_node("tools", self.tool_node)
+        workflow.add_node("budget", self.budget_node)
         
         workflow.add_edge(START, "reasoner")
         workflow.add_conditional_edges(
             "reasoner",
             self.should_continue,
-            {"tools": "tools", "end": END}
+            {"tools": "tools", "budget": "budget", "end": END}
         )
         workflow.add_edge("tools", "reasoner")
+        workflow.add_edge("budget", END)
         return workflow.compile()
 
-    async def process_query(self, user_query: str, conversation_state: dict = None):
+    async def process_query(self, user_query: str, conversation_state: dict = None, chat_id: str = None):
         if not self.graph:
             raise RuntimeError("Agent not initialized. Call .setup() first.")
 
@@ -152,17 +361,39 @@ class ReAct_Agent:
             input_state = conversation_state
             input_state["messages"].append(HumanMessage(content=user_query))
             
+        # Logs and budget counters are per turn
+        input_state["logs"] = []
+        input_state["turn"] = TurnStats(started=time.monotonic())
+        input_state["chat_id"] = chat_id or input_state.get("chat_id") or str(uuid.uuid4())
 
-        final_state = await self.graph.ainvoke(input_state)
+        # Each tool step is two graph steps; leave room for the final answer
+        recursion_limit = max(25, 2 * self.max_tool_steps + 5)
+        final_state = await self.graph.ainvoke(input_state, config={"recursion_limit": recursion_limit})
         
         return {
             "state": final_state,
             "response": final_state["messages"][-1].content,
             "tool_called": final_state.get("tool_called"),
-            "tool_result": final_state.get("tool_result"),
+            "tool_result": self.tool_result(final_state),
             "logs": final_state.get("logs", []),
+            "budget": self.budget_report(final_state),
         }
 
+    def cache_stats(self):
+        """LLM response cache hit ratio, or None when caching is disabled"""
+        if self.response_cache is None:
+            return None
+        return self.response_cache.stats()
+
     async def cleanup(self):
-        if self.stack:
-            await self.stack.aclose()
+        if self.response_cache is not None:
+            print(f"📦 LLM cache: {self.response_cache.stats()}")
+        if self.trace_mode == "record":
+            self.tracer.close()
+        elif self.trace_mode == "replay":
+            print(f"🎞️ Trace replay: {self.tracer.stats()}")
+        try:
+            if self.stack:
+                await self.stack.aclose()
+        finally:
+            await close_http_client()
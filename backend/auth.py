@@ -100,18 +100,24 @@ def get_db_dependency():
     finally:
         db.close()
 
-# Email sending (placeholder - integrate with SendGrid/Azure Communication Services)
+# Email sending - queued in the outbox and delivered by mailer.OutboxSender (printed when SMTP is not configured)
 async def send_password_reset_email(email: str, reset_token: str):
-    """Send password reset email"""
-    # TODO: Integrate with Azure Communication Services or SendGrid
+    """Queue password reset email"""
+    import asyncio
+    from mailer import OUTBOX_ENABLED, enqueue_email, print_email
+    
     reset_link = f"http://localhost:3000/reset-password?token={reset_token}"
+    body = (
+        "We received a request to reset your password.\n\n"
+        f"Reset your password here (valid for 1 hour): {reset_link}\n\n"
+        "If you did not request this, you can ignore this email."
+    )
     
-    print(f"""
-    ✉️ PASSWORD RESET EMAIL
-    To: {email}
-    Reset Link: {reset_link}
+    if not OUTBOX_ENABLED:
+        print_email(email, "Reset your password", body)
+        return True
     
-    (In production, this will be sent via Azure Communication Services)
-    """)
+    await asyncio.to_thread(enqueue_email, email, "Reset your password", body)
+    print(f"✉️ Password reset email queued for {email}")
     
     return True
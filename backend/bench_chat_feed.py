@@ -0,0 +1,89 @@
+# backend/bench_chat_feed.py
+"""Compare the N+1 sidebar load with ChatDB.get_user_chat_feed on a local SQLite copy.
+
+Usage: python bench_chat_feed.py [--chats 3000] [--messages 8]
+"""
+import argparse
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, User, Chat, Message, ChatDB, MessageDB
+
+
+def seed(db, chats: int, messages: int):
+    user_id = str(uuid.uuid4())
+    db.add(User(
+        id=user_id,
+        name="Bench User",
+        email="bench@example.com",
+        username="bench",
+        mobile="0000000000",
+        password_hash="x",
+        dob=datetime(1990, 1, 1).date(),
+    ))
+
+    start = datetime.utcnow() - timedelta(days=30)
+    rows = []
+    for c in range(chats):
+        chat_id = str(uuid.uuid4())
+        rows.append(Chat(id=chat_id, user_id=user_id, title=f"Chat {c}", tools=["do-nmap"],
+                         created_at=start, updated_at=start))
+        for m in range(messages):
+            rows.append(Message(
+                id=str(uuid.uuid4()),
+                chat_id=chat_id,
+                sender="user" if m % 2 == 0 else "ai",
+                content="{}",
+                text=f"message {m} in chat {c}",
+                timestamp=start + timedelta(minutes=c * messages + m),
+            ))
+    db.add_all(rows)
+    db.commit()
+    return user_id
+
+
+def timed(label: str, fn, repeat: int = 3):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<28} {best * 1000:10.1f} ms")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chats", type=int, default=3000)
+    parser.add_argument("--messages", type=int, default=8)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+
+    print(f"--- Seeding {args.chats} chats x {args.messages} messages ---")
+    user_id = seed(db, args.chats, args.messages)
+
+    def n_plus_one():
+        for chat in ChatDB.get_user_chats(db, user_id, limit=args.chats):
+            MessageDB.get_chat_messages(db, chat.id, include_payload=False)
+        db.expire_all()
+
+    def feed():
+        ChatDB.get_user_chat_feed(db, user_id, limit=args.chats)
+        db.expire_all()
+
+    legacy = timed("N+1 (chats + messages)", n_plus_one)
+    single = timed("get_user_chat_feed", feed)
+    print(f"Speedup: {legacy / single:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
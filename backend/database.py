@@ -1,12 +1,20 @@
 # backend/database.py
-from sqlalchemy import create_engine, Column, String, DateTime, Text, Date, Boolean, ForeignKey, JSON
+from sqlalchemy import create_engine, Column, String, DateTime, Text, Date, Boolean, ForeignKey, JSON, Integer, LargeBinary, Index, func, select
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, relationship, defer
 from sqlalchemy.pool import NullPool
 from datetime import datetime
 import os
+import json
+import zlib
+import hashlib
 import urllib.parse
 
+try:
+    import orjson
+except ImportError:  # fall back to the stdlib codec
+    orjson = None
+
 
 # Azure SQL Database Configuration
 AZURE_SQL_SERVER = os.getenv("AZURE_SQL_SERVER", "cybersecdefinitelynotskynet.database.windows.net")
@@ -76,26 +84,118 @@ class Message(Base):
     id = Column(String(36), primary_key=True)  # UUID
     chat_id = Column(String(36), ForeignKey("chats.id", ondelete="CASCADE"), nullable=False, index=True)
     sender = Column(String(20), nullable=False)  # user, ai, system
-    content = Column(Text, nullable=False)  # Store as JSON string
+    content = Column(Text, nullable=True)  # JSON string without bulky fields
+    text = Column(Text, nullable=True)  # Display text, kept typed for previews
+    response_type = Column(String(30), nullable=True)  # text, tool_execution
+    tool_name = Column(String(100), nullable=True)
+    payload = Column(LargeBinary, nullable=True)  # zlib-compressed bulky fields
+    payload_size = Column(Integer, default=0)  # Uncompressed payload bytes
     timestamp = Column(DateTime, default=datetime.utcnow, index=True)
     
     # Relationships
     chat = relationship("Chat", back_populates="messages")
+    
+    # Serves "latest message per chat" lookups for the sidebar feed
+    __table_args__ = (Index("idx_messages_chat_timestamp", "chat_id", "timestamp"),)
 
 class PasswordResetToken(Base):
     __tablename__ = "password_reset_tokens"
     
     id = Column(String(36), primary_key=True)
     email = Column(String(255), nullable=False, index=True)
-    token = Column(String(500), nullable=False, unique=True)
-    expires_at = Column(DateTime, nullable=False)
+    token = Column(String(500), nullable=True)  # Legacy rows only; lookups use token_hash
+    token_hash = Column(String(64), nullable=True, unique=True, index=True)  # SHA-256 hex
+    expires_at = Column(DateTime, nullable=False, index=True)
     used = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+    
+    id = Column(String(36), primary_key=True)
+    recipient = Column(String(255), nullable=False)
+    subject = Column(String(255), nullable=False)
+    body = Column(Text, nullable=False)
+    status = Column(String(20), default="pending", index=True)  # pending, sending, sent, failed
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, index=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+# ============= MESSAGE PAYLOAD CODEC =============
+
+# String fields at least this large are stored compressed outside the JSON content
+PAYLOAD_MIN_BYTES = int(os.getenv("MESSAGE_PAYLOAD_MIN_BYTES", "2048"))
+
+def json_dumps(data) -> bytes:
+    """Serialize to compact JSON bytes (orjson when available)"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode()
+
+def json_loads(data):
+    """Parse JSON from str or bytes (orjson when available)"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+# Where a message dict keeps its display text; stored in the typed text column, never compressed
+DISPLAY_TEXT_PATHS = (("text",), ("response", "text"))
+
+def pop_display_text(data: dict):
+    """Return (copy of data with the display text replaced by None, display text)"""
+    for *parents, leaf in DISPLAY_TEXT_PATHS:
+        copy = target = dict(data)
+        for key in parents:
+            if not isinstance(target.get(key), dict):
+                break
+            target[key] = target = dict(target[key])
+        else:
+            if isinstance(target.get(leaf), str):
+                text, target[leaf] = target[leaf], None
+                return copy, text
+    return data, None
+
+def restore_display_text(data: dict, text):
+    """Fill the None placeholder left by pop_display_text"""
+    for *parents, leaf in DISPLAY_TEXT_PATHS:
+        target = data
+        for key in parents:
+            target = target.get(key) if isinstance(target, dict) else None
+        if isinstance(target, dict) and leaf in target and target[leaf] is None:
+            target[leaf] = text
+            return data
+    return data
+
+def split_payload(data: dict, path: tuple = ()):
+    """Split a message dict into small fields and a list of [key_path, value] large strings"""
+    hot = {}
+    bulky = []
+    for key, value in data.items():
+        if isinstance(value, dict):
+            hot[key], nested = split_payload(value, path + (key,))
+            bulky.extend(nested)
+        elif isinstance(value, str) and len(value) >= PAYLOAD_MIN_BYTES:
+            bulky.append([list(path + (key,)), value])
+        else:
+            hot[key] = value
+    return hot, bulky
+
+def merge_payload(data: dict, bulky: list):
+    """Put large fields produced by split_payload back into a message dict"""
+    for key_path, value in bulky:
+        *parents, leaf = key_path
+        target = data
+        for key in parents:
+            target = target.setdefault(key, {})
+        target[leaf] = value
+    return data
+
 # ============= DATABASE INITIALIZATION =============
 
 def init_database():
-    """Create all tables"""
+    """Create missing tables (existing tables are never altered; run upgrade_azure_sql.sql for that)"""
     try:
         Base.metadata.create_all(bind=engine)
         print("✅ Database tables created successfully!")
@@ -218,6 +318,60 @@ class ChatDB:
         
         return chats
     
+    @staticmethod
+    def get_user_chat_ids(db, user_id: str) -> set:
+        """Ids of all chats owned by a user"""
+        rows = db.query(Chat.id).filter(Chat.user_id == user_id).all()
+        return {row.id for row in rows}
+    
+    @staticmethod
+    def get_user_chat_feed(db, user_id: str, limit: int = 50, snippet_length: int = 120):
+        """Get a user's chats with last message preview, message count and last activity in one query"""
+        # Correlated lookups are index seeks on (chat_id, timestamp), one per chat row
+        last_message_id = select(Message.id).where(
+            Message.chat_id == Chat.id
+        ).order_by(
+            Message.timestamp.desc()
+        ).limit(1).correlate(Chat).scalar_subquery()
+        
+        message_count = select(func.count(Message.id)).where(
+            Message.chat_id == Chat.id
+        ).correlate(Chat).scalar_subquery()
+        
+        last_activity = func.coalesce(Message.timestamp, Chat.updated_at)
+        
+        rows = db.query(
+            Chat,
+            Message.sender,
+            Message.text,
+            message_count,
+            last_activity,
+        ).outerjoin(
+            Message, Message.id == last_message_id
+        ).filter(
+            Chat.user_id == user_id
+        ).order_by(
+            last_activity.desc()
+        ).limit(limit).all()
+        
+        feed = []
+        for chat, sender, text, message_count, activity in rows:
+            feed.append({
+                "id": chat.id,
+                "title": chat.title,
+                "tools": chat.tools or [],
+                "created_at": chat.created_at.isoformat(),
+                "updated_at": chat.updated_at.isoformat(),
+                "last_message": {
+                    "sender": sender,
+                    "snippet": (text or "")[:snippet_length],
+                } if sender else None,
+                "message_count": message_count or 0,
+                "last_activity": activity.isoformat() if activity else None,
+            })
+        
+        return feed
+    
     @staticmethod
     def get_chat_by_id(db, chat_id: str):
         """Get chat by ID"""
@@ -253,56 +407,84 @@ class MessageDB:
     def create_message(db, chat_id: str, message_data: dict):
         """Create new message"""
         import uuid
-        import json
         
         message_id = str(uuid.uuid4())
         
-        # Convert message_data to JSON string for storage
-        content = json.dumps(message_data)
+        # Display text goes to the text column; of the rest, small fields stay JSON and
+        # bulky ones (tool output) move into a compressed payload
+        content_data, display_text = pop_display_text(message_data)
+        hot_data, bulky_fields = split_payload(content_data)
+        response = message_data.get("response") or {}
+        tool_call = (response.get("toolData") or {}).get("toolCall") or {}
         
         message = Message(
             id=message_id,
             chat_id=chat_id,
             sender=message_data.get("sender", "user"),
-            content=content
+            content=json_dumps(hot_data).decode(),
+            text=display_text,
+            response_type=response.get("type"),
+            tool_name=tool_call.get("name"),
         )
         
+        if bulky_fields:
+            raw = json_dumps(bulky_fields)
+            message.payload = zlib.compress(raw, 6)
+            message.payload_size = len(raw)
+        
         db.add(message)
         db.commit()
         db.refresh(message)
         return message
     
     @staticmethod
-    def get_chat_messages(db, chat_id: str, limit: int = 100):
-        """Get all messages for a chat"""
-        import json
+    def _to_dict(msg, include_payload: bool):
+        msg_dict = {
+            "id": msg.id,
+            "chat_id": msg.chat_id,
+            "sender": msg.sender,
+            "timestamp": msg.timestamp.isoformat()
+        }
+        
+        # Parse content JSON
+        try:
+            content = json_loads(msg.content)
+            msg_dict.update(restore_display_text(content, msg.text))
+        except Exception:
+            msg_dict["text"] = msg.content or msg.text
+        
+        if msg.payload_size:
+            if include_payload and msg.payload is not None:
+                merge_payload(msg_dict, json_loads(zlib.decompress(msg.payload)))
+            else:
+                msg_dict["payload_deferred"] = True
+                msg_dict["payload_size"] = msg.payload_size
         
-        messages = db.query(Message).filter(
+        return msg_dict
+    
+    @staticmethod
+    def get_chat_messages(db, chat_id: str, limit: int = 100, include_payload: bool = True):
+        """Get all messages for a chat (bulky payloads are skipped unless include_payload)"""
+        query = db.query(Message).filter(
             Message.chat_id == chat_id
-        ).order_by(
+        )
+        
+        if not include_payload:
+            query = query.options(defer(Message.payload))
+        
+        messages = query.order_by(
             Message.timestamp.asc()
         ).limit(limit).all()
         
-        # Parse JSON content
-        result = []
-        for msg in messages:
-            msg_dict = {
-                "id": msg.id,
-                "chat_id": msg.chat_id,
-                "sender": msg.sender,
-                "timestamp": msg.timestamp.isoformat()
-            }
-            
-            # Parse content JSON
-            try:
-                content = json.loads(msg.content)
-                msg_dict.update(content)
-            except:
-                msg_dict["text"] = msg.content
-            
-            result.append(msg_dict)
-        
-        return result
+        return [MessageDB._to_dict(msg, include_payload) for msg in messages]
+    
+    @staticmethod
+    def get_message(db, message_id: str):
+        """Get a single message with its payload inflated"""
+        msg = db.query(Message).filter(Message.id == message_id).first()
+        if msg:
+            return MessageDB._to_dict(msg, include_payload=True)
+        return None
     
     @staticmethod
     def delete_chat_messages(db, chat_id: str):
@@ -313,6 +495,10 @@ class MessageDB:
 
 # ============= PASSWORD RESET TOKEN OPERATIONS =============
 
+def hash_token(token: str) -> str:
+    """Fixed-length SHA-256 digest used to index reset tokens"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
 class PasswordResetDB:
     @staticmethod
     def create_reset_token(db, email: str, token: str, expires_at: datetime):
@@ -322,7 +508,7 @@ class PasswordResetDB:
         reset_token = PasswordResetToken(
             id=str(uuid.uuid4()),
             email=email,
-            token=token,
+            token_hash=hash_token(token),
             expires_at=expires_at
         )
         
@@ -335,7 +521,7 @@ class PasswordResetDB:
         """Get valid (unused and not expired) reset token"""
         now = datetime.utcnow()
         return db.query(PasswordResetToken).filter(
-            PasswordResetToken.token == token,
+            PasswordResetToken.token_hash == hash_token(token),
             PasswordResetToken.used == False,
             PasswordResetToken.expires_at > now
         ).first()
@@ -344,11 +530,171 @@ class PasswordResetDB:
     def mark_token_used(db, token: str):
         """Mark reset token as used"""
         reset_token = db.query(PasswordResetToken).filter(
-            PasswordResetToken.token == token
+            PasswordResetToken.token_hash == hash_token(token)
         ).first()
         
         if reset_token:
             reset_token.used = True
             db.commit()
             return True
-        return False
\ No newline at end of file
+        return False
+    
+    @staticmethod
+    def purge_expired_tokens(db, batch_size: int = 500):
+        """Delete expired or used reset tokens in bounded batches, returns rows deleted"""
+        now = datetime.utcnow()
+        deleted = 0
+        
+        while True:
+            ids = [row.id for row in db.query(PasswordResetToken.id).filter(
+                (PasswordResetToken.expires_at <= now) | (PasswordResetToken.used == True)
+            ).limit(batch_size).all()]
+            
+            if not ids:
+                break
+            
+            deleted += db.query(PasswordResetToken).filter(
+                PasswordResetToken.id.in_(ids)
+            ).delete(synchronize_session=False)
+            db.commit()
+            
+            if len(ids) < batch_size:
+                break
+        
+        return deleted
+
+
+# ============= EMAIL OUTBOX OPERATIONS =============
+
+class EmailOutboxDB:
+    @staticmethod
+    def enqueue(db, recipient: str, subject: str, body: str):
+        """Queue an email for the background sender"""
+        import uuid
+        
+        email = EmailOutbox(
+            id=str(uuid.uuid4()),
+            recipient=recipient,
+            subject=subject,
+            body=body
+        )
+        
+        db.add(email)
+        db.commit()
+        return email
+    
+    @staticmethod
+    def claim_due(db, limit: int = 20, lease_seconds: int = 300, max_attempts: int = 6):
+        """Claim due emails for sending and count the attempt; a claim expires after lease_seconds if the sender dies"""
+        from datetime import timedelta
+        
+        now = datetime.utcnow()
+        
+        # Expired leases that already used every attempt (the sender kept dying mid-batch)
+        exhausted = db.query(EmailOutbox).filter(
+            EmailOutbox.status == "sending",
+            EmailOutbox.next_attempt_at <= now,
+            EmailOutbox.attempts >= max_attempts
+        ).update({
+            "status": "failed",
+            "last_error": f"Lease expired after {max_attempts} attempts"
+        }, synchronize_session=False)
+        if exhausted:
+            db.commit()
+        
+        candidates = db.query(EmailOutbox.id).filter(
+            EmailOutbox.status.in_(["pending", "sending"]),
+            EmailOutbox.next_attempt_at <= now,
+            EmailOutbox.attempts < max_attempts
+        ).order_by(
+            EmailOutbox.next_attempt_at.asc()
+        ).limit(limit).all()
+        
+        claimed = []
+        for (email_id,) in candidates:
+            # Conditional update so two senders never claim the same row
+            updated = db.query(EmailOutbox).filter(
+                EmailOutbox.id == email_id,
+                EmailOutbox.status.in_(["pending", "sending"]),
+                EmailOutbox.next_attempt_at <= now
+            ).update({
+                "status": "sending",
+                "attempts": EmailOutbox.attempts + 1,
+                "next_attempt_at": now + timedelta(seconds=lease_seconds)
+            }, synchronize_session=False)
+            if updated:
+                claimed.append(email_id)
+        db.commit()
+        
+        if not claimed:
+            return []
+        return db.query(EmailOutbox).filter(EmailOutbox.id.in_(claimed)).all()
+    
+    @staticmethod
+    def mark_sent(db, email_id: str):
+        """Mark email as delivered"""
+        email = db.query(EmailOutbox).filter(EmailOutbox.id == email_id).first()
+        if email:
+            email.status = "sent"
+            email.sent_at = datetime.utcnow()
+            email.last_error = None
+            db.commit()
+            return email
+        return None
+    
+    @staticmethod
+    def mark_failed(db, email_id: str, error: str, retry_at: datetime = None):
+        """Record a failed attempt (counted at claim time); retry at retry_at or give up when it is None"""
+        email = db.query(EmailOutbox).filter(EmailOutbox.id == email_id).first()
+        if email:
+            email.last_error = error
+            if retry_at is None:
+                email.status = "failed"
+            else:
+                email.status = "pending"
+                email.next_attempt_at = retry_at
+            db.commit()
+            return email
+        return None
+    
+    @staticmethod
+    def queue_stats(db):
+        """Queue depth and oldest pending email"""
+        depth = db.query(func.count(EmailOutbox.id)).filter(
+            EmailOutbox.status.in_(["pending", "sending"])
+        ).scalar()
+        failed = db.query(func.count(EmailOutbox.id)).filter(
+            EmailOutbox.status == "failed"
+        ).scalar()
+        oldest = db.query(func.min(EmailOutbox.created_at)).filter(
+            EmailOutbox.status.in_(["pending", "sending"])
+        ).scalar()
+        return {
+            "depth": depth or 0,
+            "failed": failed or 0,
+            "oldest_pending_seconds": round((datetime.utcnow() - oldest).total_seconds(), 1) if oldest else None,
+        }
+    
+    @staticmethod
+    def purge_sent(db, older_than: datetime, batch_size: int = 500):
+        """Delete delivered emails sent before older_than in bounded batches"""
+        deleted = 0
+        
+        while True:
+            ids = [row.id for row in db.query(EmailOutbox.id).filter(
+                EmailOutbox.status == "sent",
+                EmailOutbox.sent_at < older_than
+            ).limit(batch_size).all()]
+            
+            if not ids:
+                break
+            
+            deleted += db.query(EmailOutbox).filter(
+                EmailOutbox.id.in_(ids)
+            ).delete(synchronize_session=False)
+            db.commit()
+            
+            if len(ids) < batch_size:
+                break
+        
+        return deleted
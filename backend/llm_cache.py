@@ -0,0 +1,109 @@
+# backend/llm_cache.py
+import hashlib
+import json
+import os
+
+from langchain_core.messages import message_to_dict, messages_from_dict
+
+
+def _message_fingerprint(message) -> dict:
+    """Fields of a message that affect the model's answer (ids and metadata vary per run)."""
+    return {
+        "type": message.type,
+        "content": message.content,
+        "tool_calls": getattr(message, "tool_calls", None) or [],
+        "tool_call_id": getattr(message, "tool_call_id", None),
+        "name": message.name,
+    }
+
+
+def request_key(messages, tool_schemas, model_params):
+    """Stable hash of everything that determines an LLM response."""
+    payload = {
+        "messages": [_message_fingerprint(m) for m in messages],
+        "tools": tool_schemas,
+        "params": model_params,
+    }
+    raw = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class LLMResponseCache:
+    """Exact-match disk cache of LLM responses with size-based eviction."""
+
+    def __init__(self, cache_dir: str, max_bytes: int = 256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        """Build a cache from LLM_CACHE_DIR, or return None when caching is off."""
+        cache_dir = os.getenv("LLM_CACHE_DIR")
+        if not cache_dir:
+            return None
+        max_mb = int(os.getenv("LLM_CACHE_MAX_MB", "256"))
+        return cls(cache_dir, max_bytes=max_mb * 1024 * 1024)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str):
+        """Return the cached message for key, or None."""
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        # Touch the entry so eviction drops least recently used first
+        os.utime(path, None)
+        self.hits += 1
+        return messages_from_dict([data])[0]
+
+    def put(self, key: str, message):
+        """Store a response message and evict old entries if over budget."""
+        tmp_path = f"{self._path(key)}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(message_to_dict(message), f, default=str)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            print(f"⚠️ Unable to write LLM cache entry: {e}")
+            return
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith(".json"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self) -> dict:
+        """Hit/miss counters for reporting."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,159 @@
+# backend/llm_client.py
+import asyncio
+import os
+import random
+import time
+from collections import deque
+
+import httpx
+import openai
+
+# Errors worth retrying: network trouble, rate limits and 5xx from upstream
+TRANSIENT_ERRORS = (
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+_http_client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared keep-alive HTTP client for all LLM calls in this process."""
+    global _http_client
+
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "20")),
+                max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE", "10")),
+                keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_SECONDS", "60")),
+            ),
+            timeout=httpx.Timeout(float(os.getenv("LLM_TIMEOUT_SECONDS", "90")), connect=10.0),
+        )
+    return _http_client
+
+
+async def close_http_client():
+    """Close the shared HTTP client."""
+    global _http_client
+
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+class ResilientInvoker:
+    """Invoke an LLM with jittered retries and optional hedged requests."""
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        hedge: bool = False,
+        hedge_percentile: float = 95.0,
+        hedge_min_samples: int = 20,
+    ):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.latencies = deque(maxlen=500)
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @classmethod
+    def from_env(cls):
+        """Build an invoker from LLM_* environment variables."""
+        return cls(
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+            base_delay=float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5")),
+            max_delay=float(os.getenv("LLM_RETRY_MAX_DELAY", "8")),
+            hedge=os.getenv("LLM_HEDGE", "0") == "1",
+            hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "95")),
+            hedge_min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+        )
+
+    def _percentile(self, pct: float):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(int(len(ordered) * pct / 100), len(ordered) - 1)
+        return ordered[index]
+
+    def hedge_delay(self):
+        """Seconds to wait before sending a duplicate request, or None to not hedge."""
+        if not self.hedge or len(self.latencies) < self.hedge_min_samples:
+            return None
+        return self._percentile(self.hedge_percentile)
+
+    async def ainvoke(self, llm, inputs):
+        """Invoke llm with retries on transient errors."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self._hedged(llm, inputs)
+            except TRANSIENT_ERRORS:
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                # Full jitter keeps concurrent chats from retrying in lockstep
+                backoff = min(self.max_delay, self.base_delay * 2 ** attempt)
+                await asyncio.sleep(random.uniform(0, backoff))
+
+    async def _hedged(self, llm, inputs):
+        delay = self.hedge_delay()
+        started = time.perf_counter()
+        if delay is None:
+            response = await llm.ainvoke(inputs)
+            self.latencies.append(time.perf_counter() - started)
+            return response
+
+        primary = asyncio.create_task(llm.ainvoke(inputs))
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if done:
+            response = primary.result()
+            self.latencies.append(time.perf_counter() - started)
+            return response
+
+        self.hedges += 1
+        backup = asyncio.create_task(llm.ainvoke(inputs))
+        pending = {primary, backup}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self.hedge_wins += 1
+                        # Latency as the caller saw it, hedge delay included; measuring
+                        # the backup alone would pull p95 (and the next hedge delay) down
+                        self.latencies.append(time.perf_counter() - started)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict:
+        """Retry/hedge counters and observed latency percentiles."""
+        p50 = self._percentile(50)
+        p95 = self._percentile(95)
+        return {
+            "latency_samples": len(self.latencies),
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
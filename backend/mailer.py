@@ -0,0 +1,172 @@
+# backend/mailer.py
+import asyncio
+import logging
+import os
+import random
+import smtplib
+from collections import deque
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+
+logger = logging.getLogger(__name__)
+
+# SMTP Configuration (point SMTP_HOST/SMTP_PORT at a local debug server for testing)
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "25"))
+SMTP_USERNAME = os.getenv("SMTP_USERNAME")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_USE_TLS = os.getenv("SMTP_USE_TLS", "0") == "1"
+SMTP_FROM = os.getenv("SMTP_FROM", "no-reply@definitelynotskynet.local")
+
+# "smtp" queues emails in the outbox for OutboxSender; "console" just prints them (dev default)
+EMAIL_DELIVERY = os.getenv("EMAIL_DELIVERY", "smtp" if SMTP_HOST else "console").lower()
+OUTBOX_ENABLED = EMAIL_DELIVERY == "smtp"
+
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "20"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_RETRY_BASE_SECONDS = float(os.getenv("OUTBOX_RETRY_BASE_SECONDS", "30"))
+
+
+def print_email(recipient: str, subject: str, body: str):
+    """Console delivery for development, when no SMTP server is configured"""
+    print(f"\n✉️ {subject}\nTo: {recipient}\n\n{body}\n\n(Set SMTP_HOST to deliver emails through the outbox)\n")
+
+
+def enqueue_email(recipient: str, subject: str, body: str):
+    """Queue an email; the OutboxSender delivers it in the background"""
+    from database import SessionLocal, EmailOutboxDB
+
+    db = SessionLocal()
+    try:
+        return EmailOutboxDB.enqueue(db, recipient, subject, body).id
+    finally:
+        db.close()
+
+
+def deliver_batch(emails: list) -> dict:
+    """Send emails over one SMTP connection; returns {email_id: error or None}"""
+    results = {}
+    try:
+        with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30) as smtp:
+            if SMTP_USE_TLS:
+                smtp.starttls()
+            if SMTP_USERNAME:
+                smtp.login(SMTP_USERNAME, SMTP_PASSWORD)
+
+            for email in emails:
+                # A bad row (e.g. a newline in the subject) must not abort the rest of the batch
+                try:
+                    message = EmailMessage()
+                    message["From"] = SMTP_FROM
+                    message["To"] = email.recipient
+                    message["Subject"] = email.subject
+                    message.set_content(email.body)
+                    smtp.send_message(message)
+                    results[email.id] = None
+                except (OSError, smtplib.SMTPServerDisconnected):
+                    raise  # connection-level, handled below
+                except Exception as e:
+                    results[email.id] = f"{type(e).__name__}: {e}"
+    except (OSError, smtplib.SMTPException) as e:
+        # Connection-level failure: every unsent email in the batch gets retried
+        for email in emails:
+            results.setdefault(email.id, f"{type(e).__name__}: {e}")
+    return results
+
+
+class OutboxSender:
+    """Polls the email outbox and delivers due emails with retry and backoff"""
+
+    def __init__(self, poll_seconds: float = OUTBOX_POLL_SECONDS, batch_size: int = OUTBOX_BATCH_SIZE):
+        self.poll_seconds = poll_seconds
+        self.batch_size = batch_size
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.latencies = deque(maxlen=500)
+        self._task = None
+
+    def _retry_at(self, attempts: int):
+        if attempts >= OUTBOX_MAX_ATTEMPTS:
+            return None
+        delay = OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+        return datetime.utcnow() + timedelta(seconds=random.uniform(delay / 2, delay))
+
+    def run_once(self) -> int:
+        """Deliver one batch of due emails (blocking); returns how many were attempted"""
+        from database import SessionLocal, EmailOutboxDB
+
+        db = SessionLocal()
+        try:
+            emails = EmailOutboxDB.claim_due(db, limit=self.batch_size, max_attempts=OUTBOX_MAX_ATTEMPTS)
+            if not emails:
+                return 0
+
+            results = deliver_batch(emails)
+            for email in emails:
+                error = results.get(email.id, "not attempted")
+                if error is None:
+                    sent = EmailOutboxDB.mark_sent(db, email.id)
+                    self.sent += 1
+                    self.latencies.append((sent.sent_at - sent.created_at).total_seconds())
+                    continue
+
+                retry_at = self._retry_at(email.attempts)  # already counted by claim_due
+                EmailOutboxDB.mark_failed(db, email.id, error, retry_at)
+                if retry_at is None:
+                    self.failed += 1
+                    logger.error(f"❌ Giving up on email {email.id} to {email.recipient}: {error}")
+                else:
+                    self.retried += 1
+                    logger.warning(f"⚠️ Email {email.id} failed, retrying at {retry_at.isoformat()}: {error}")
+            return len(emails)
+        finally:
+            db.close()
+
+    async def _loop(self):
+        while True:
+            try:
+                attempted = await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                logger.error(f"❌ Outbox sender error: {e}")
+                attempted = 0
+            # A full batch usually means more is waiting
+            if attempted < self.batch_size:
+                await asyncio.sleep(self.poll_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        """Queue depth (from the DB) plus delivery counters and latency"""
+        from database import SessionLocal, EmailOutboxDB
+
+        db = SessionLocal()
+        try:
+            queue = EmailOutboxDB.queue_stats(db)
+        finally:
+            db.close()
+
+        ordered = sorted(self.latencies)
+        def pct(p):
+            return round(ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)], 2) if ordered else None
+
+        return {
+            **queue,
+            "sent": self.sent,
+            "retried": self.retried,
+            "gave_up": self.failed,
+            "delivery_latency_p50_seconds": pct(50),
+            "delivery_latency_p95_seconds": pct(95),
+        }
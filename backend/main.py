@@ -1,45 +1,186 @@
+import argparse
 import asyncio
+import json
+import sys
+import time
+
+from langchain_core.messages import HumanMessage, ToolMessage
+
 from agent import ReAct_Agent
 
-async def main():
-    active_tools = ["do-nmap"] 
-    agent = ReAct_Agent()
-    
-    print("--- 🛠️ Initializing MCP Stack and LLM ---")
-    try:
-        await agent.setup(active_tools)
-    except Exception as e:
-        print(f"❌ Failed to setup agent: {e}")
-        return
-    
+
+async def interactive(agent):
     chat_state = None
-     
+    logs = []
+
     print("\n--- 💬 Chat Started (Type 'exit' to stop) ---")
-    
+
     while True:
         user_input = input("\nUser: ")
         if user_input.lower() in ["exit", "quit"]:
             break
 
         try:
-            
+
             result = await agent.process_query(
                 user_query=user_input,
                 conversation_state=chat_state
             )
 
             chat_state = result["state"]
-            
+            logs = result.get("logs", [])
+
 
             print("\n--- 🤖 Agent Response ---")
             print(result["response"])
 
         except Exception as e:
             print(f"⚠️ Error: {e}")
-    
-    print("\n--- 🧹 Cleaning up resources ---")
-    await agent.cleanup()
-    logs = result.get("logs", [])
+
+    return logs
+
+
+def load_scripts(path: str) -> list:
+    """Read batch input: plain-text lines are single queries, JSON lines may hold multi-turn scripts.
+
+    JSON forms: {"id": "...", "query": "..."} or {"id": "...", "turns": ["...", "..."]}
+    """
+    source = sys.stdin if path == "-" else open(path)
+    scripts = []
+    try:
+        for line_no, line in enumerate(source, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                try:
+                    item = json.loads(line)
+                except ValueError as e:
+                    print(f"⚠️ Skipping line {line_no}: invalid JSON ({e})", file=sys.stderr)
+                    continue
+                turns = item.get("turns") or ([item["query"]] if item.get("query") else None)
+                if not isinstance(turns, list) or not all(isinstance(t, str) and t.strip() for t in turns):
+                    print(f"⚠️ Skipping line {line_no}: needs a \"query\" string or a \"turns\" list of strings", file=sys.stderr)
+                    continue
+                scripts.append({"id": str(item.get("id", line_no)), "turns": turns})
+            else:
+                scripts.append({"id": str(line_no), "turns": [line]})
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    return scripts
+
+
+def tools_used(state: dict) -> list:
+    """Names of tools run in the latest turn"""
+    names = []
+    for message in reversed(state["messages"]):
+        if isinstance(message, HumanMessage):
+            break
+        if isinstance(message, ToolMessage):
+            names.append(message.name)
+    return list(reversed(names))
+
+
+async def run_script(agent, script: dict, semaphore, write):
+    async with semaphore:
+        chat_state = None
+        for turn, query in enumerate(script["turns"], start=1):
+            record = {"id": script["id"], "turn": turn, "query": query}
+            started = time.perf_counter()
+            try:
+                result = await agent.process_query(query, chat_state, chat_id=str(script["id"]))
+                chat_state = result["state"]
+                budget = result.get("budget") or {}
+                record.update({
+                    "response": result["response"],
+                    "tools": tools_used(chat_state),
+                    "tool_steps": budget.get("tool_steps", 0),
+                    "tokens": budget.get("tokens", 0),
+                    "stopped": budget.get("stopped"),
+                })
+            except Exception as e:
+                record["error"] = f"{type(e).__name__}: {e}"
+            record["latency_seconds"] = round(time.perf_counter() - started, 3)
+            write(record)
+            if "error" in record:
+                break  # later turns depend on this one
+
+
+async def batch(agent, args):
+    scripts = load_scripts(args.batch)
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    records = []
+
+    def write(record):
+        records.append(record)
+        output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        output.flush()
+
+    print(f"--- 📦 Running {len(scripts)} scripts with concurrency {args.concurrency} ---", file=sys.stderr)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(run_script(agent, s, semaphore, write) for s in scripts))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(r["latency_seconds"] for r in records)
+    def pct(p):
+        return latencies[min(int(len(latencies) * p / 100), len(latencies) - 1)] if latencies else None
+
+    summary = {
+        "scripts": len(scripts),
+        "turns": len(records),
+        "errors": sum(1 for r in records if "error" in r),
+        "tool_steps": sum(r.get("tool_steps", 0) for r in records),
+        "tokens": sum(r.get("tokens", 0) for r in records),
+        "wall_seconds": round(elapsed, 3),
+        "turns_per_second": round(len(records) / elapsed, 3) if elapsed else None,
+        "latency_p50_seconds": pct(50),
+        "latency_p95_seconds": pct(95),
+    }
+    print("\n--- 📊 Batch Summary ---", file=sys.stderr)
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="CyberSec agent CLI")
+    parser.add_argument("--tools", default="do-nmap", help="Comma separated tools to enable")
+    parser.add_argument("--batch", metavar="FILE", help="Run queries/scripts from FILE ('-' for stdin)")
+    parser.add_argument("--concurrency", type=positive_int, default=4, help="Scripts run concurrently in batch mode")
+    parser.add_argument("--output", default="-", help="JSONL results file for batch mode ('-' for stdout)")
+    args = parser.parse_args()
+
+    active_tools = [t.strip() for t in args.tools.split(",") if t.strip()]
+    agent = ReAct_Agent()
+
+    print("--- 🛠️ Initializing MCP Stack and LLM ---", file=sys.stderr)
+    try:
+        await agent.setup(active_tools)
+    except Exception as e:
+        print(f"❌ Failed to setup agent: {e}")
+        return
+
+    logs = []
+    try:
+        if args.batch:
+            await batch(agent, args)
+        else:
+            logs = await interactive(agent)
+    finally:
+        print("\n--- 🧹 Cleaning up resources ---", file=sys.stderr)
+        await agent.cleanup()
+
     if logs:
         print("\n--- 📜 Execution Logs ---")
         for log in logs:
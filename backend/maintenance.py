@@ -0,0 +1,119 @@
+# backend/maintenance.py
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+MAINTENANCE_INTERVAL_SECONDS = float(os.getenv("MAINTENANCE_INTERVAL_SECONDS", "300"))
+CHAT_STATE_IDLE_SECONDS = float(os.getenv("CHAT_STATE_IDLE_SECONDS", "3600"))
+RESET_TOKEN_PURGE_BATCH = int(os.getenv("RESET_TOKEN_PURGE_BATCH", "500"))
+OUTBOX_RETENTION_DAYS = float(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
+
+
+def purge_reset_tokens():
+    """Delete expired or used password reset tokens"""
+    from database import SessionLocal, PasswordResetDB
+
+    db = SessionLocal()
+    try:
+        return PasswordResetDB.purge_expired_tokens(db, batch_size=RESET_TOKEN_PURGE_BATCH)
+    finally:
+        db.close()
+
+
+def purge_sent_emails():
+    """Delete delivered outbox emails older than OUTBOX_RETENTION_DAYS"""
+    from datetime import datetime, timedelta
+    from database import SessionLocal, EmailOutboxDB
+
+    cutoff = datetime.utcnow() - timedelta(days=OUTBOX_RETENTION_DAYS)
+    db = SessionLocal()
+    try:
+        return EmailOutboxDB.purge_sent(db, cutoff, batch_size=RESET_TOKEN_PURGE_BATCH)
+    finally:
+        db.close()
+
+
+def prune_idle_states(states: dict, last_seen: dict, max_idle: float = CHAT_STATE_IDLE_SECONDS):
+    """Drop in-memory chat states that have not been used for max_idle seconds"""
+    cutoff = time.monotonic() - max_idle
+    idle = [chat_id for chat_id, seen in last_seen.items() if seen < cutoff]
+    for chat_id in idle:
+        states.pop(chat_id, None)
+        last_seen.pop(chat_id, None)
+    return len(idle)
+
+
+class MaintenanceScheduler:
+    """Runs registered maintenance jobs periodically on the event loop"""
+
+    def __init__(self, interval: float = MAINTENANCE_INTERVAL_SECONDS):
+        self.interval = interval
+        self.jobs = []
+        self.history = deque(maxlen=20)
+        self._task = None
+
+    def add_job(self, name: str, func):
+        """Register a job; sync functions run in a thread so DB calls don't block the loop"""
+        self.jobs.append((name, func))
+
+    async def run_once(self) -> dict:
+        """Run every job once and record how long each took"""
+        started = time.perf_counter()
+        results = {}
+
+        for name, func in self.jobs:
+            job_started = time.perf_counter()
+            try:
+                if asyncio.iscoroutinefunction(func):
+                    outcome = await func()
+                else:
+                    outcome = await asyncio.to_thread(func)
+                error = None
+            except Exception as e:
+                outcome = None
+                error = str(e)
+                logger.error(f"❌ Maintenance job {name} failed: {e}")
+
+            results[name] = {
+                "result": outcome,
+                "error": error,
+                "duration_ms": round((time.perf_counter() - job_started) * 1000, 1),
+            }
+
+        record = {
+            "finished_at": time.time(),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+            "jobs": results,
+        }
+        self.history.append(record)
+        logger.info(f"🧹 Maintenance pass finished in {record['duration_ms']} ms: {results}")
+        return record
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.run_once()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "interval_seconds": self.interval,
+            "jobs": [name for name, _ in self.jobs],
+            "passes": list(self.history),
+        }
@@ -0,0 +1,189 @@
+# backend/rescan.py
+import json
+import os
+import re
+import time
+
+from sharding import TARGET_KEYS, PORT_KEYS
+
+RESCAN_TOOLS = {"do-nmap", "do-masscan"}
+RESCAN_ENABLED = os.getenv("AGENT_RESCAN_MODE", "0") == "1"
+RESCAN_STORE_PATH = os.getenv("RESCAN_STORE_PATH", ".rescan_store.json")
+TIMELINE_LIMIT = int(os.getenv("RESCAN_TIMELINE_LIMIT", "50"))
+
+NMAP_HOST = re.compile(r"^Nmap scan report for (.+)$")
+NMAP_PORT = re.compile(r"^(\d+)/(tcp|udp)\s+(\S+)\s+(\S+)\s*(.*)$")
+MASSCAN_PORT = re.compile(r"Discovered open port (\d+)/(tcp|udp) on (\S+)")
+
+
+def parse_scan(text: str) -> dict:
+    """Parse nmap or masscan output into {host: {"ports": {...}, "findings": [...]}}."""
+    hosts = {}
+    host = None
+
+    for line in str(text).splitlines():
+        line = line.rstrip()
+        header = NMAP_HOST.match(line)
+        if header:
+            host = hosts.setdefault(header.group(1), {"ports": {}, "findings": []})
+            continue
+
+        masscan = MASSCAN_PORT.search(line)
+        if masscan:
+            port, proto, ip = masscan.groups()
+            entry = hosts.setdefault(ip, {"ports": {}, "findings": []})
+            entry["ports"][f"{port}/{proto}"] = {"state": "open", "service": "", "version": ""}
+            continue
+
+        if host is None:
+            continue
+        port_line = NMAP_PORT.match(line)
+        if port_line:
+            port, proto, state, service, version = port_line.groups()
+            host["ports"][f"{port}/{proto}"] = {"state": state, "service": service, "version": version.strip()}
+        elif line.startswith("|") and line not in host["findings"]:
+            # NSE script output, e.g. "| ssl-cert: ..." or "|_http-title: ..."
+            host["findings"].append(line)
+
+    return hosts
+
+
+def _open_ports(host: dict) -> dict:
+    return {p: info for p, info in host["ports"].items() if info["state"].startswith("open")}
+
+
+def diff_scans(old: dict, new: dict) -> dict:
+    """Structured difference between two parsed scans."""
+    delta = {"new_hosts": [], "gone_hosts": [], "opened": [], "closed": [], "changed": [], "new_findings": []}
+
+    for host in new:
+        if host not in old:
+            delta["new_hosts"].append(host)
+    for host in old:
+        if host not in new:
+            delta["gone_hosts"].append(host)
+
+    for host, current in new.items():
+        previous = old.get(host, {"ports": {}, "findings": []})
+        before, after = _open_ports(previous), _open_ports(current)
+
+        for port, info in after.items():
+            if port not in before:
+                delta["opened"].append({"host": host, "port": port, "service": info["service"], "version": info["version"]})
+            elif (info["service"], info["version"]) != (before[port]["service"], before[port]["version"]):
+                delta["changed"].append({
+                    "host": host,
+                    "port": port,
+                    "before": f"{before[port]['service']} {before[port]['version']}".strip(),
+                    "after": f"{info['service']} {info['version']}".strip(),
+                })
+        for port in before:
+            if port not in after:
+                delta["closed"].append({"host": host, "port": port})
+
+        for finding in current["findings"]:
+            if finding not in previous["findings"]:
+                delta["new_findings"].append({"host": host, "finding": finding})
+
+    return delta
+
+
+def summarize_delta(delta: dict) -> str:
+    counts = [f"{len(v)} {k.replace('_', ' ')}" for k, v in delta.items() if v]
+    return ", ".join(counts) if counts else "no changes"
+
+
+def format_delta(tool_name: str, target: str, delta: dict, previous_at: float) -> str:
+    """Compact text sent to the model in place of the full rescan output."""
+    since = time.strftime("%Y-%m-%d %H:%M:%S UTC", time.gmtime(previous_at))
+    lines = [f"Rescan of {target} with {tool_name}: {summarize_delta(delta)} since {since}."]
+
+    for host in delta["new_hosts"]:
+        lines.append(f"+ new host {host}")
+    for host in delta["gone_hosts"]:
+        lines.append(f"- host no longer seen {host}")
+    for item in delta["opened"]:
+        lines.append(f"+ {item['host']} {item['port']} open {item['service']} {item['version']}".rstrip())
+    for item in delta["closed"]:
+        lines.append(f"- {item['host']} {item['port']} closed")
+    for item in delta["changed"]:
+        lines.append(f"~ {item['host']} {item['port']} {item['before']} -> {item['after']}")
+    for item in delta["new_findings"]:
+        lines.append(f"! {item['host']} {item['finding']}")
+    return "\n".join(lines)
+
+
+class RescanStore:
+    """Last parsed scan and change timeline per (chat, tool, target), persisted as JSON."""
+
+    def __init__(self, path: str = RESCAN_STORE_PATH):
+        self.path = path
+        self.entries = self._load()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠️ Unable to write rescan store: {e}")
+
+    @staticmethod
+    def scan_key(tool_args: dict):
+        """(target, ports) identifying a scan, or None when there is no target argument"""
+        target = next((tool_args[k] for k in TARGET_KEYS if tool_args.get(k)), None)
+        if target is None:
+            return None
+        ports = next((str(tool_args[k]) for k in PORT_KEYS if tool_args.get(k)), "")
+        return str(target), ports
+
+    def apply(self, chat_id: str, tool_name: str, tool_args: dict, output: str):
+        """Record a scan of one chat; returns the delta text to show instead of output, or None for a full report"""
+        scan_key = self.scan_key(tool_args)
+        parsed = parse_scan(output)
+        if scan_key is None or not parsed:
+            return None
+
+        target, ports = scan_key
+        key = f"{chat_id}|{tool_name}|{target}"
+        self.entries = self._load()  # other worker processes may have written since
+        now = time.time()
+        previous = self.entries.get(key)
+        entry = {"ports": ports, "parsed": parsed, "at": now, "timeline": []}
+
+        delta_text = None
+        if previous and previous["ports"] == ports:
+            delta = diff_scans(previous["parsed"], parsed)
+            delta_text = format_delta(tool_name, target, delta, previous["at"])
+            entry["timeline"] = previous["timeline"]
+            entry["timeline"].append({"at": now, "summary": summarize_delta(delta), "delta": delta})
+        else:
+            hosts = len(parsed)
+            open_ports = sum(len(_open_ports(h)) for h in parsed.values())
+            entry["timeline"] = (previous or {}).get("timeline", [])
+            entry["timeline"].append({"at": now, "summary": f"baseline: {hosts} hosts, {open_ports} open ports"})
+
+        entry["timeline"] = entry["timeline"][-TIMELINE_LIMIT:]
+        self.entries[key] = entry
+        self._save()
+        return delta_text
+
+    def timeline(self, chat_ids, target: str = None) -> dict:
+        """Change timeline per chat and tool|target for the given chats, optionally for one target"""
+        timelines = {}
+        for key, entry in self._load().items():
+            parts = key.split("|", 2)
+            if len(parts) != 3:
+                continue  # written before baselines were kept per chat
+            chat_id, tool_name, scanned = parts
+            if chat_id in chat_ids and (target is None or scanned == target):
+                timelines.setdefault(chat_id, {})[f"{tool_name}|{scanned}"] = entry["timeline"]
+        return timelines
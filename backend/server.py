@@ -1,12 +1,18 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
 import asyncio
+import hashlib
 import os
+import time
 import logging
 import gc
 
+from maintenance import MaintenanceScheduler, purge_reset_tokens, purge_sent_emails, prune_idle_states
+from mailer import OutboxSender, OUTBOX_ENABLED, EMAIL_DELIVERY
+from auth import get_current_user, get_db_dependency
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -14,6 +20,10 @@ logger = logging.getLogger(__name__)
 agent = None
 agent_ready = False
 
+# AGENT_WORKERS > 1 runs agents in separate processes, routed by chat_id
+AGENT_WORKERS = int(os.environ.get("AGENT_WORKERS", "1"))
+worker_pool = None
+
 app = FastAPI(title="CyberSec Assistant API")
 
 app.add_middleware(
@@ -25,6 +35,19 @@ app.add_middleware(
 )
 
 conversation_states = {}
+conversation_last_seen = {}
+
+async def prune_chat_states():
+    """Drop idle conversation states (runs on the event loop, next to /api/chat)"""
+    return prune_idle_states(conversation_states, conversation_last_seen)
+
+maintenance = MaintenanceScheduler()
+maintenance.add_job("purge_reset_tokens", purge_reset_tokens)
+maintenance.add_job("prune_idle_chat_states", prune_chat_states)
+if OUTBOX_ENABLED:
+    maintenance.add_job("purge_sent_emails", purge_sent_emails)
+
+outbox_sender = OutboxSender()
 
 class ChatRequest(BaseModel):
     query: str
@@ -35,6 +58,7 @@ class ChatResponse(BaseModel):
     success: bool
     response: str
     tool_call: Optional[Dict[str, Any]] = None
+    budget: Optional[Dict[str, Any]] = None
     agent_ready: bool = True
 
 async def get_agent():
@@ -57,6 +81,42 @@ async def get_agent():
     
     return agent
 
+async def get_worker_pool():
+    """Lazy start the multi-process worker pool"""
+    global worker_pool, agent_ready
+    
+    if worker_pool is None:
+        from workers import WorkerPool
+        logger.info(f"🔧 Starting {AGENT_WORKERS} agent workers...")
+        worker_pool = WorkerPool(AGENT_WORKERS)
+        await worker_pool.start()
+        agent_ready = True
+    
+    return worker_pool
+
+@app.on_event("startup")
+async def startup():
+    maintenance.start()
+    if OUTBOX_ENABLED:
+        outbox_sender.start()
+    else:
+        logger.info("✉️ SMTP not configured; emails are printed to the console")
+
+@app.on_event("shutdown")
+async def shutdown():
+    await maintenance.stop()
+    await outbox_sender.stop()
+    if worker_pool is not None:
+        await worker_pool.shutdown()
+    elif agent is not None:
+        try:
+            await agent.cleanup()
+        except RuntimeError as e:
+            # The MCP stdio session was opened in the request task that lazily
+            # created the agent; anyio refuses to close it from the shutdown task.
+            # The subprocess exits with the server either way.
+            logger.warning(f"⚠️ Agent cleanup incomplete: {e}")
+
 @app.get("/")
 async def root():
     return {
@@ -68,11 +128,26 @@ async def root():
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy", "agent_ready": agent_ready}
+    return {
+        "status": "healthy",
+        "agent_ready": agent_ready,
+        "llm_cache": agent.cache_stats() if agent else None,
+        "llm_client": agent.invoker.stats() if agent else None,
+    }
 
 @app.post("/api/chat")
 async def chat(request: ChatRequest):
     try:
+        if AGENT_WORKERS > 1:
+            pool = await get_worker_pool()
+            result = await pool.submit(request.chat_id, request.query, timeout=120)
+            return ChatResponse(
+                success=True,
+                response=result.get("response", "No response"),
+                budget=result.get("budget"),
+                agent_ready=True
+            )
+        
         # Initialize agent only when first chat comes
         current_agent = await get_agent()
         
@@ -80,8 +155,9 @@ async def chat(request: ChatRequest):
             conversation_states[request.chat_id] = {"messages": [], "logs": []}
         
         state = conversation_states[request.chat_id]
+        conversation_last_seen[request.chat_id] = time.monotonic()
         result = await asyncio.wait_for(
-            current_agent.process_query(request.query, state),
+            current_agent.process_query(request.query, state, chat_id=request.chat_id),
             timeout=120
         )
         
@@ -90,6 +166,7 @@ async def chat(request: ChatRequest):
         return ChatResponse(
             success=True,
             response=result.get("response", "No response"),
+            budget=result.get("budget"),
             agent_ready=True
         )
         
@@ -107,6 +184,103 @@ async def chat(request: ChatRequest):
             agent_ready=agent_ready
         )
 
+def owned_chat(db, chat_id: str, user):
+    """Chat row of the current user, or 404"""
+    from database import ChatDB
+    
+    chat = ChatDB.get_chat_by_id(db, chat_id)
+    if chat is None or chat.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    return chat
+
+@app.get("/api/chats")
+def get_chats(limit: int = 50, current_user=Depends(get_current_user), db=Depends(get_db_dependency)):
+    """Sidebar feed: chats with last message snippet, message count and last activity"""
+    from database import ChatDB
+    
+    chats = ChatDB.get_user_chat_feed(db, current_user.id, limit=min(limit, 200))
+    return {"success": True, "chats": chats, "count": len(chats)}
+
+@app.get("/api/chats/{chat_id}/messages")
+def get_chat_messages(
+    chat_id: str,
+    include_payload: bool = False,
+    current_user=Depends(get_current_user),
+    db=Depends(get_db_dependency)
+):
+    """Chat history; bulky tool output is left out unless include_payload"""
+    from database import MessageDB
+    
+    owned_chat(db, chat_id, current_user)
+    messages = MessageDB.get_chat_messages(db, chat_id, include_payload=include_payload)
+    return {"success": True, "messages": messages}
+
+@app.get("/api/chats/{chat_id}/messages/{message_id}")
+def get_chat_message(
+    chat_id: str,
+    message_id: str,
+    current_user=Depends(get_current_user),
+    db=Depends(get_db_dependency)
+):
+    """One message with its tool output inflated"""
+    from database import MessageDB
+    
+    owned_chat(db, chat_id, current_user)
+    message = MessageDB.get_message(db, message_id)
+    if message is None or message["chat_id"] != chat_id:
+        raise HTTPException(status_code=404, detail="Message not found")
+    return {"success": True, "message": message}
+
+@app.get("/api/workers")
+async def get_workers():
+    if worker_pool is None:
+        return {"success": True, "mode": "single", "workers": []}
+    return {"success": True, "mode": "multi", **worker_pool.stats()}
+
+@app.get("/api/diagnostics/memory")
+async def memory_diagnostics():
+    """Approximate resident bytes held per conversation (chat ids are hashed)"""
+    if worker_pool is not None:
+        workers = await worker_pool.memory_report()
+        chats = {}
+        for sizes in workers.values():
+            chats.update(sizes or {})
+        per_worker = {w: sum(sizes.values()) if sizes is not None else None for w, sizes in workers.items()}
+    else:
+        from utils import deep_sizeof
+        chats = {chat_id: deep_sizeof(state) for chat_id, state in conversation_states.items()}
+        per_worker = None
+    
+    # /api/chat is keyed by chat_id alone, so never expose the ids themselves
+    return {
+        "success": True,
+        "chat_count": len(chats),
+        "total_bytes": sum(chats.values()),
+        "per_worker_bytes": per_worker,
+        "chats": {hashlib.sha256(chat_id.encode()).hexdigest()[:12]: size for chat_id, size in chats.items()},
+    }
+
+@app.get("/api/rescans")
+def get_rescans(target: Optional[str] = None, current_user=Depends(get_current_user), db=Depends(get_db_dependency)):
+    """Change timeline of repeated scans in the current user's chats, optionally for one target"""
+    from database import ChatDB
+    from rescan import RescanStore
+    
+    # Read from disk: with AGENT_WORKERS > 1 the scans are recorded in the worker processes
+    chat_ids = ChatDB.get_user_chat_ids(db, current_user.id)
+    return {"success": True, "timelines": RescanStore().timeline(chat_ids, target)}
+
+@app.get("/api/maintenance")
+async def get_maintenance():
+    return {"success": True, **maintenance.stats()}
+
+@app.get("/api/outbox")
+async def get_outbox():
+    if not OUTBOX_ENABLED:
+        return {"success": True, "delivery": EMAIL_DELIVERY}
+    stats = await asyncio.to_thread(outbox_sender.stats)
+    return {"success": True, "delivery": EMAIL_DELIVERY, **stats}
+
 @app.get("/api/tools")
 async def get_tools():
     tools = [
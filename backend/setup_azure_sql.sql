@@ -5,6 +5,7 @@ GO
 IF OBJECT_ID('dbo.messages', 'U') IS NOT NULL DROP TABLE dbo.messages;
 IF OBJECT_ID('dbo.chats', 'U') IS NOT NULL DROP TABLE dbo.chats;
 IF OBJECT_ID('dbo.password_reset_tokens', 'U') IS NOT NULL DROP TABLE dbo.password_reset_tokens;
+IF OBJECT_ID('dbo.email_outbox', 'U') IS NOT NULL DROP TABLE dbo.email_outbox;
 IF OBJECT_ID('dbo.users', 'U') IS NOT NULL DROP TABLE dbo.users;
 GO
 
@@ -48,7 +49,12 @@ CREATE TABLE messages (
     id VARCHAR(36) PRIMARY KEY,
     chat_id VARCHAR(36) NOT NULL,
     sender VARCHAR(20) NOT NULL,
-    content NVARCHAR(MAX) NOT NULL, -- Store JSON as string
+    content NVARCHAR(MAX), -- JSON string without bulky fields
+    text NVARCHAR(MAX), -- Display text, kept typed for previews
+    response_type VARCHAR(30),
+    tool_name VARCHAR(100),
+    payload VARBINARY(MAX), -- zlib-compressed bulky fields (tool output)
+    payload_size INT DEFAULT 0,
     timestamp DATETIME2 DEFAULT GETUTCDATE(),
     FOREIGN KEY (chat_id) REFERENCES chats(id) ON DELETE CASCADE
 );
@@ -56,12 +62,14 @@ CREATE TABLE messages (
 -- Create indexes for messages
 CREATE INDEX idx_messages_chat_id ON messages(chat_id);
 CREATE INDEX idx_messages_timestamp ON messages(timestamp);
+CREATE INDEX idx_messages_chat_timestamp ON messages(chat_id, timestamp);
 
 -- Password reset tokens table
 CREATE TABLE password_reset_tokens (
     id VARCHAR(36) PRIMARY KEY,
     email VARCHAR(255) NOT NULL,
-    token VARCHAR(500) NOT NULL UNIQUE,
+    token VARCHAR(500), -- legacy rows only; lookups use token_hash
+    token_hash CHAR(64) UNIQUE, -- SHA-256 hex of the token
     expires_at DATETIME2 NOT NULL,
     used BIT DEFAULT 0,
     created_at DATETIME2 DEFAULT GETUTCDATE()
@@ -69,7 +77,24 @@ CREATE TABLE password_reset_tokens (
 
 -- Create index for password reset tokens
 CREATE INDEX idx_reset_tokens_email ON password_reset_tokens(email);
-CREATE INDEX idx_reset_tokens_token ON password_reset_tokens(token);
+CREATE INDEX idx_reset_tokens_expires_at ON password_reset_tokens(expires_at);
+
+-- Outbox for emails sent by the background sender
+CREATE TABLE email_outbox (
+    id VARCHAR(36) PRIMARY KEY,
+    recipient VARCHAR(255) NOT NULL,
+    subject VARCHAR(255) NOT NULL,
+    body NVARCHAR(MAX) NOT NULL,
+    status VARCHAR(20) DEFAULT 'pending', -- pending, sending, sent, failed
+    attempts INT DEFAULT 0,
+    next_attempt_at DATETIME2 DEFAULT GETUTCDATE(),
+    last_error NVARCHAR(MAX),
+    created_at DATETIME2 DEFAULT GETUTCDATE(),
+    sent_at DATETIME2
+);
+
+CREATE INDEX idx_email_outbox_status ON email_outbox(status);
+CREATE INDEX idx_email_outbox_next_attempt ON email_outbox(next_attempt_at);
 
 GO
 
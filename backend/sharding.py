@@ -0,0 +1,244 @@
+# backend/sharding.py
+import asyncio
+import ipaddress
+import os
+import re
+import time
+
+# Scanner tools whose target/port arguments can be split into independent shards
+SHARDABLE_TOOLS = {"do-nmap", "do-masscan"}
+TARGET_KEYS = ("target", "targets", "host", "hosts", "ip_range", "range")
+PORT_KEYS = ("ports", "port", "port_range")
+
+SHARDING_ENABLED = os.getenv("SCAN_SHARDING", "1") == "1"
+SHARD_PREFIX = int(os.getenv("SCAN_SHARD_PREFIX", "24"))
+PORTS_PER_SHARD = int(os.getenv("SCAN_PORTS_PER_SHARD", "8192"))
+SHARD_CONCURRENCY = int(os.getenv("SCAN_SHARD_CONCURRENCY", "4"))
+MAX_SHARDS = int(os.getenv("SCAN_MAX_SHARDS", "64"))
+MAX_PORTS_PER_SHARD = 65536
+
+# masscan paces itself with --rate; running its shards side by side would multiply the packet rate
+RATE_LIMITED_TOOLS = {"do-masscan"}
+
+HOST_HEADER = re.compile(r"^Nmap scan report for (.+)$")
+
+
+def split_targets(target: str, prefix: int = SHARD_PREFIX) -> list:
+    """Split comma/space separated targets so no CIDR block is larger than /prefix."""
+    shards = []
+    for item in re.split(r"[,\s]+", target.strip()):
+        if not item:
+            continue
+        try:
+            network = ipaddress.ip_network(item, strict=False)
+        except ValueError:
+            shards.append(item)  # hostname or nmap range syntax, keep as-is
+            continue
+        if network.version == 4 and network.prefixlen < prefix:
+            shards.extend(str(subnet) for subnet in network.subnets(new_prefix=prefix))
+        else:
+            shards.append(item)
+    return shards
+
+
+def count_targets(target: str, prefix: int = SHARD_PREFIX) -> int:
+    """Number of shards split_targets would return, without building them."""
+    count = 0
+    for item in re.split(r"[,\s]+", target.strip()):
+        if not item:
+            continue
+        try:
+            network = ipaddress.ip_network(item, strict=False)
+        except ValueError:
+            count += 1
+            continue
+        if network.version == 4 and network.prefixlen < prefix:
+            count += 2 ** (prefix - network.prefixlen)
+        else:
+            count += 1
+    return count
+
+
+def group_targets(targets: list, groups: int, separator: str) -> list:
+    """Join targets into at most groups consecutive, evenly sized target lists."""
+    size = -(-len(targets) // groups)
+    return [separator.join(targets[i:i + size]) for i in range(0, len(targets), size)]
+
+
+def split_ports(spec: str, per_shard: int = PORTS_PER_SHARD):
+    """Split a port spec like '1-65535' or '22,80,8000-9000' into chunks, or None if unparsable."""
+    ports = []
+    for part in str(spec).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        match = re.fullmatch(r"(\d+)(?:-(\d+))?", part)
+        if not match:
+            return None
+        low = int(match.group(1))
+        high = int(match.group(2) or low)
+        ports.append((low, high))
+
+    # Merge overlapping/adjacent ranges so no port is scanned twice
+    merged = []
+    for low, high in sorted(ports):
+        if merged and low <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], high)
+        else:
+            merged.append([low, high])
+
+    chunks = []
+    current = []
+    count = 0
+    for low, high in merged:
+        while low <= high:
+            take = min(high - low + 1, per_shard - count)
+            end = low + take - 1
+            current.append(f"{low}-{end}" if end > low else str(low))
+            count += take
+            low = end + 1
+            if count == per_shard:
+                chunks.append(",".join(current))
+                current, count = [], 0
+    if current:
+        chunks.append(",".join(current))
+    return chunks
+
+
+def plan_shards(tool_name: str, tool_args: dict):
+    """Return a list of argument dicts to run instead of tool_args, or None when not worth sharding."""
+    if not SHARDING_ENABLED or tool_name not in SHARDABLE_TOOLS:
+        return None
+
+    target_key = next((k for k in TARGET_KEYS if isinstance(tool_args.get(k), str)), None)
+    port_key = next((k for k in PORT_KEYS if tool_args.get(k) not in (None, "")), None)
+
+    per_shard = PORTS_PER_SHARD
+    port_chunks = (split_ports(tool_args[port_key], per_shard) if port_key else None) or [None]
+
+    targets = [None]
+    if target_key:
+        # Keep within SCAN_MAX_SHARDS: first split into larger CIDR blocks...
+        target = tool_args[target_key]
+        budget = max(MAX_SHARDS // len(port_chunks), 1)
+        prefix = SHARD_PREFIX
+        while prefix > 0 and count_targets(target, prefix) > budget:
+            prefix -= 1
+        targets = split_targets(target, prefix)
+
+    # ...then scan more ports per shard...
+    while len(targets) * len(port_chunks) > MAX_SHARDS and port_chunks != [None] and per_shard < MAX_PORTS_PER_SHARD:
+        per_shard *= 2
+        port_chunks = split_ports(tool_args[port_key], per_shard)
+
+    # ...and finally give each shard several targets (hostnames and ranges can't be coarsened)
+    if len(targets) * len(port_chunks) > MAX_SHARDS:
+        separator = "," if "," in tool_args[target_key] else " "
+        targets = group_targets(targets, max(MAX_SHARDS // len(port_chunks), 1), separator)
+
+    if len(targets) * len(port_chunks) <= 1:
+        return None
+
+    shards = []
+    for target in targets:
+        for ports in port_chunks:
+            shard = dict(tool_args)
+            if target is not None:
+                shard[target_key] = target
+            if ports is not None:
+                shard[port_key] = ports
+            shards.append(shard)
+    return shards
+
+
+def shard_concurrency(tool_name: str) -> int:
+    """How many shards of this tool may run at once"""
+    return 1 if tool_name in RATE_LIMITED_TOOLS else SHARD_CONCURRENCY
+
+
+def _shard_label(shard_args: dict) -> str:
+    return ", ".join(str(v) for k, v in shard_args.items() if k in TARGET_KEYS + PORT_KEYS)
+
+
+def merge_results(results: list) -> str:
+    """Merge shard outputs: group nmap host sections and drop repeated lines."""
+    preamble = []
+    hosts = {}
+    seen = set()
+
+    for text in results:
+        section = None
+        for line in str(text).splitlines():
+            header = HOST_HEADER.match(line)
+            if header:
+                section = hosts.setdefault(header.group(1), [line])
+                continue
+            if not line.strip():
+                section = None
+                continue
+            if section is not None:
+                if line not in section:
+                    section.append(line)
+            elif line not in seen:
+                seen.add(line)
+                preamble.append(line)
+
+    blocks = ["\n".join(preamble)] if preamble else []
+    blocks.extend("\n".join(lines) for lines in hosts.values())
+    return "\n\n".join(blocks)
+
+
+async def run_sharded(tool, shards: list, concurrency: int = SHARD_CONCURRENCY, timeout: float = None):
+    """Run shards concurrently with a cap; returns (merged_output, progress_logs, complete).
+
+    Shards still running when timeout expires are cancelled; the output of the
+    finished ones is kept and the missing shards are listed at the end.
+    complete is False when any shard timed out, raised or returned a TOOL ERROR.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    logs = []
+    done = 0
+
+    async def run(index, shard_args):
+        nonlocal done
+        async with semaphore:
+            started = time.perf_counter()
+            result = await tool.ainvoke(shard_args)
+        done += 1
+        logs.append(
+            f"🧩 Shard {index + 1}/{len(shards)} ({_shard_label(shard_args)}) finished in "
+            f"{time.perf_counter() - started:.1f}s [{done}/{len(shards)} done]"
+        )
+        return result
+
+    tasks = [asyncio.create_task(run(i, s)) for i, s in enumerate(shards)]
+    try:
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+    finally:
+        # Also reached when the caller is cancelled
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    results, missing = [], []
+    for index, task in enumerate(tasks):
+        if task in pending:
+            missing.append(f"{_shard_label(shards[index])} (not finished within {timeout:.0f}s)")
+        elif task.exception() is not None:
+            error = task.exception()
+            missing.append(f"{_shard_label(shards[index])} ({type(error).__name__}: {error})")
+        elif str(task.result()).startswith("TOOL ERROR"):
+            missing.append(f"{_shard_label(shards[index])} ({task.result()})")
+        else:
+            results.append(task.result())
+
+    merged = merge_results(results)
+    if missing:
+        logs.append(f"⚠️ {len(missing)}/{len(shards)} shards incomplete")
+        note = f"INCOMPLETE: {len(missing)} of {len(shards)} shards returned no results:\n" + "\n".join(
+            f"- {item}" for item in missing
+        )
+        merged = f"{merged}\n\n{note}" if merged else note
+    return merged, logs, not missing
@@ -0,0 +1,112 @@
+# backend/tracing.py
+import json
+import os
+import time
+from collections import defaultdict, deque
+
+from langchain_core.messages import message_to_dict, messages_from_dict
+
+
+def _args_key(name: str, args: dict) -> str:
+    return f"{name}:{json.dumps(args, sort_keys=True, default=str)}"
+
+
+class TraceRecorder:
+    """Appends model and tool calls of live agent runs to a JSONL trace file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a", buffering=1)
+
+    def _write(self, event: dict):
+        event["at"] = round(time.time(), 3)
+        self._file.write(json.dumps(event, separators=(",", ":"), default=str) + "\n")
+
+    def record_catalog(self, catalog: list):
+        self._write({"kind": "catalog", "tools": catalog})
+
+    def record_model(self, key: str, inputs: list, response, seconds: float):
+        last = inputs[-1]
+        self._write({
+            "kind": "model",
+            "key": key,
+            "messages": len(inputs),
+            "last": {"type": last.type, "content": last.content},
+            "response": message_to_dict(response),
+            "ms": round(seconds * 1000, 2),
+        })
+
+    def record_tool(self, name: str, args: dict, result, seconds: float):
+        self._write({
+            "kind": "tool",
+            "name": name,
+            "args": args,
+            "result": str(result),
+            "ms": round(seconds * 1000, 2),
+        })
+
+    def close(self):
+        self._file.close()
+
+
+class TracePlayer:
+    """Serves recorded model and tool responses in place of OpenAI and MCP."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.catalog = []
+        self._models = defaultdict(deque)
+        self._tools = defaultdict(deque)
+        self.served = {"model": 0, "tool": 0}
+        self.recorded_ms = {"model": 0.0, "tool": 0.0}
+
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if event["kind"] == "catalog":
+                    self.catalog = event["tools"]
+                elif event["kind"] == "model":
+                    self._models[event["key"]].append(event)
+                elif event["kind"] == "tool":
+                    self._tools[_args_key(event["name"], event["args"])].append(event)
+
+    def model_response(self, key: str):
+        """Next recorded response for this exact request"""
+        events = self._models.get(key)
+        if not events:
+            raise KeyError(f"No recorded model response for request {key[:12]} in {self.path}")
+        # Keep the last recording around so repeated requests still replay
+        event = events.popleft() if len(events) > 1 else events[0]
+        self.served["model"] += 1
+        self.recorded_ms["model"] += event["ms"]
+        return messages_from_dict([event["response"]])[0]
+
+    def tool_result(self, name: str, args: dict) -> str:
+        """Next recorded output for this tool call"""
+        events = self._tools.get(_args_key(name, args))
+        if not events:
+            raise KeyError(f"No recorded result for {name}({args}) in {self.path}")
+        event = events.popleft() if len(events) > 1 else events[0]
+        self.served["tool"] += 1
+        self.recorded_ms["tool"] += event["ms"]
+        return event["result"]
+
+    def stats(self) -> dict:
+        """Replayed calls and the upstream time they stood in for"""
+        return {
+            "served": dict(self.served),
+            "recorded_ms": {k: round(v, 1) for k, v in self.recorded_ms.items()},
+        }
+
+
+def tracer_from_env():
+    """Return (mode, recorder_or_player) from AGENT_TRACE_MODE / AGENT_TRACE_FILE."""
+    mode = os.getenv("AGENT_TRACE_MODE", "").lower()
+    path = os.getenv("AGENT_TRACE_FILE", "agent_trace.jsonl")
+    if mode == "record":
+        return mode, TraceRecorder(path)
+    if mode == "replay":
+        return mode, TracePlayer(path)
+    return None, None
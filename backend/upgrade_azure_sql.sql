@@ -0,0 +1,96 @@
+-- Upgrade an existing database in place (setup_azure_sql.sql drops everything).
+-- init_database() / create_all only creates missing tables; it never alters existing ones.
+-- Every step checks first, so the script can be re-run safely.
+USE cybersec_db;
+GO
+
+-- ============= MESSAGES: typed hot columns + compressed payload =============
+
+IF COL_LENGTH('dbo.messages', 'text') IS NULL
+    ALTER TABLE dbo.messages ADD text NVARCHAR(MAX) NULL; -- Display text, kept typed for previews
+IF COL_LENGTH('dbo.messages', 'response_type') IS NULL
+    ALTER TABLE dbo.messages ADD response_type VARCHAR(30) NULL;
+IF COL_LENGTH('dbo.messages', 'tool_name') IS NULL
+    ALTER TABLE dbo.messages ADD tool_name VARCHAR(100) NULL;
+IF COL_LENGTH('dbo.messages', 'payload') IS NULL
+    ALTER TABLE dbo.messages ADD payload VARBINARY(MAX) NULL; -- zlib-compressed bulky fields (tool output)
+IF COL_LENGTH('dbo.messages', 'payload_size') IS NULL
+    ALTER TABLE dbo.messages ADD payload_size INT NULL CONSTRAINT df_messages_payload_size DEFAULT 0 WITH VALUES;
+GO
+
+-- content was NOT NULL; new rows may keep everything in the typed columns
+ALTER TABLE dbo.messages ALTER COLUMN content NVARCHAR(MAX) NULL;
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'idx_messages_chat_timestamp' AND object_id = OBJECT_ID('dbo.messages'))
+    CREATE INDEX idx_messages_chat_timestamp ON dbo.messages(chat_id, timestamp);
+GO
+
+-- Existing rows keep their full JSON in content (MessageDB reads it as before);
+-- backfill the typed columns so previews and the sidebar feed work for old chats.
+-- (JSON_VALUE stops at 4000 chars; longer texts stay NULL here and only lose the preview.)
+UPDATE dbo.messages
+SET text = COALESCE(JSON_VALUE(content, '$.text'), JSON_VALUE(content, '$.response.text')),
+    response_type = JSON_VALUE(content, '$.response.type'),
+    tool_name = JSON_VALUE(content, '$.response.toolData.toolCall.name')
+WHERE text IS NULL AND ISJSON(content) = 1;
+GO
+
+-- ============= PASSWORD RESET TOKENS: store SHA-256 digests, not tokens =============
+
+IF COL_LENGTH('dbo.password_reset_tokens', 'token_hash') IS NULL
+    ALTER TABLE dbo.password_reset_tokens ADD token_hash CHAR(64) NULL; -- SHA-256 hex of the token
+GO
+
+-- Hash outstanding tokens (same digest as database.hash_token) and drop the plaintext
+UPDATE dbo.password_reset_tokens
+SET token_hash = LOWER(CONVERT(CHAR(64), HASHBYTES('SHA2_256', token), 2)),
+    token = NULL
+WHERE token IS NOT NULL AND token_hash IS NULL;
+GO
+
+-- The old UNIQUE constraint on token has a generated name; it must go before token can be NULL
+DECLARE @constraint SYSNAME = (
+    SELECT kc.name
+    FROM sys.key_constraints kc
+    JOIN sys.index_columns ic ON ic.object_id = kc.parent_object_id AND ic.index_id = kc.unique_index_id
+    JOIN sys.columns c ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+    WHERE kc.parent_object_id = OBJECT_ID('dbo.password_reset_tokens') AND kc.type = 'UQ' AND c.name = 'token'
+);
+IF @constraint IS NOT NULL
+    EXEC('ALTER TABLE dbo.password_reset_tokens DROP CONSTRAINT ' + @constraint);
+GO
+
+ALTER TABLE dbo.password_reset_tokens ALTER COLUMN token VARCHAR(500) NULL; -- legacy rows only
+GO
+
+-- Filtered so pre-upgrade rows without a digest don't collide on NULL
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'idx_reset_tokens_token_hash' AND object_id = OBJECT_ID('dbo.password_reset_tokens'))
+    CREATE UNIQUE INDEX idx_reset_tokens_token_hash ON dbo.password_reset_tokens(token_hash) WHERE token_hash IS NOT NULL;
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'idx_reset_tokens_expires_at' AND object_id = OBJECT_ID('dbo.password_reset_tokens'))
+    CREATE INDEX idx_reset_tokens_expires_at ON dbo.password_reset_tokens(expires_at);
+GO
+
+-- ============= EMAIL OUTBOX =============
+
+IF OBJECT_ID('dbo.email_outbox', 'U') IS NULL
+BEGIN
+    CREATE TABLE email_outbox (
+        id VARCHAR(36) PRIMARY KEY,
+        recipient VARCHAR(255) NOT NULL,
+        subject VARCHAR(255) NOT NULL,
+        body NVARCHAR(MAX) NOT NULL,
+        status VARCHAR(20) DEFAULT 'pending', -- pending, sending, sent, failed
+        attempts INT DEFAULT 0,
+        next_attempt_at DATETIME2 DEFAULT GETUTCDATE(),
+        last_error NVARCHAR(MAX),
+        created_at DATETIME2 DEFAULT GETUTCDATE(),
+        sent_at DATETIME2
+    );
+    CREATE INDEX idx_email_outbox_status ON email_outbox(status);
+    CREATE INDEX idx_email_outbox_next_attempt ON email_outbox(next_attempt_at);
+END
+GO
+
+PRINT '✅ Database upgraded';
+GO
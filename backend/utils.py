@@ -3,6 +3,10 @@ from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
 from contextlib import AsyncExitStack
 import json
+import hashlib
+import os
+import sys
+import time
 from jsonschema import validate, ValidationError
 from langchain_core.tools import StructuredTool
 from pydantic import create_model
@@ -35,6 +39,26 @@ def validate_arguments(inputs_args, schema):
         return f"Invalid: {e.message}"
 
 
+def deep_sizeof(obj, seen=None):
+    """Approximate resident size of an object graph in bytes."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, int, float, bool, type(None))):
+        return size
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    if hasattr(obj, "__dict__"):
+        size += deep_sizeof(vars(obj), seen)
+    return size
+
+
 MAP = {
     "string": str,
     "number": float,
@@ -95,6 +119,92 @@ def build_tool_from_schema(tool_name, tool_description, tool_schema, session):
     return tool
 
 
+TOOL_CACHE_PATH = os.getenv("MCP_TOOL_CACHE_PATH", ".mcp_tool_cache.json")
+
+
+def catalog_cache_key(server_info, server_version):
+    """Hash an mcp.json server definition together with the live server version."""
+    raw = json.dumps({"server": server_info, "version": server_version}, sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def load_tool_cache():
+    """Load the on-disk tool catalog cache."""
+    try:
+        with open(TOOL_CACHE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_tool_cache(cache):
+    """Persist the tool catalog cache (written atomically)."""
+    tmp_path = f"{TOOL_CACHE_PATH}.{os.getpid()}.tmp"  # worker processes save concurrently
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, TOOL_CACHE_PATH)
+    except OSError as e:
+        print(f"⚠️ Unable to write tool cache: {e}")
+
+
+async def fetch_tool_catalog(session):
+    """List a server's tools and strip their schemas down to what the LLM needs."""
+    server_tools = await session.list_tools()
+    return [
+        {
+            "name": tool.name,
+            "description": tool.description,
+            "schema": remove_descriptions(tool.inputSchema, max_length=200),
+        }
+        for tool in server_tools.tools
+    ]
+
+
+async def revalidate_tool_catalog(server_name, session, cache_key, cached_entry, registry, on_change=None):
+    """Compare a cached catalog with the live server; on drift refresh the cache and rebuild the tools.
+
+    registry is the (tools, input_schemas, name_to_tool) returned by configure_mcp; it is
+    updated in place so the running agent stops offering removed or outdated tools.
+    """
+    try:
+        live_catalog = await fetch_tool_catalog(session)
+    except Exception as e:
+        print(f"⚠️ Could not revalidate tool cache for {server_name}: {e}")
+        return
+
+    if live_catalog == cached_entry["tools"]:
+        return
+
+    cache = load_tool_cache()
+    cache[server_name] = {**cached_entry, "key": cache_key, "tools": live_catalog}
+    save_tool_cache(cache)
+
+    cached = {entry["name"]: entry for entry in cached_entry["tools"]}
+    live = {entry["name"]: entry for entry in live_catalog}
+    removed = [name for name in cached if name not in live]
+    added = [name for name in live if name not in cached]
+    changed = [name for name in live if name in cached and live[name] != cached[name]]
+    print(
+        f"⚠️ Tool catalog for {server_name} changed "
+        f"(added: {added or '-'}, removed: {removed or '-'}, changed: {changed or '-'}); rebuilding tools"
+    )
+
+    tools, input_schemas, name_to_tool = registry
+    for name in removed:
+        input_schemas.pop(name, None)
+        name_to_tool.pop(name, None)
+    for name in added + changed:
+        entry = live[name]
+        input_schemas[name] = entry["schema"]
+        name_to_tool[name] = build_tool_from_schema(name, entry["description"], entry["schema"], session)
+    tools[:] = [name_to_tool[t.name] for t in tools if t.name in name_to_tool]
+    tools.extend(name_to_tool[name] for name in added)
+
+    if on_change is not None:
+        on_change()
+
+
 def load_config():
     """Load MCP server config."""
     config_path = "mcp.json"
@@ -107,8 +217,12 @@ def load_config():
         return None
 
 
-async def configure_mcp():
-    """Configure MCP servers and tools."""
+async def configure_mcp(on_catalog_change=None):
+    """Configure MCP servers and tools.
+
+    on_catalog_change is called after a cached catalog turned out to be stale and
+    the returned tools were rebuilt in place.
+    """
     mcp_servers = load_config()
     if not mcp_servers:
         raise Exception("No MCP servers configured")
@@ -118,6 +232,11 @@ async def configure_mcp():
     name_to_tool = {}
     tools = []
 
+    tool_cache = load_tool_cache()
+    cache_dirty = False
+    revalidations = []
+    time_saved = 0.0
+
     stack = AsyncExitStack()
     await stack.__aenter__()
 
@@ -134,22 +253,65 @@ async def configure_mcp():
                 ClientSession(read_stream=read, write_stream=write)
             )
 
-            await session.initialize()
+            init_result = await session.initialize()
             print(f"✅ Session initialized for {server_name}")
 
             server_session_dict[server_name] = session
 
-            server_tools = await session.list_tools()
-            for tool in server_tools.tools:
-                clean_schema = remove_descriptions(tool.inputSchema, max_length=200)
-                input_schemas[tool.name] = clean_schema
+            server_version = getattr(getattr(init_result, "serverInfo", None), "version", None)
+            cache_key = catalog_cache_key(server_info, server_version)
+            cached_entry = tool_cache.get(server_name)
+            started = time.perf_counter()
+
+            if cached_entry and cached_entry.get("key") == cache_key:
+                catalog = cached_entry["tools"]
+                revalidations.append((server_name, session, cache_key, cached_entry))
+            else:
+                catalog = await fetch_tool_catalog(session)
+                cached_entry = None
+
+            for entry in catalog:
+                input_schemas[entry["name"]] = entry["schema"]
                 create_tool = build_tool_from_schema(
-                    tool.name, tool.description, clean_schema, session
+                    entry["name"], entry["description"], entry["schema"], session
                 )
                 tools.append(create_tool)
-                name_to_tool[tool.name] = create_tool
+                name_to_tool[entry["name"]] = create_tool
+
+            elapsed = time.perf_counter() - started
+            if cached_entry:
+                saved = max(cached_entry.get("build_seconds", 0.0) - elapsed, 0.0)
+                time_saved += saved
+                print(f"⚡ {server_name}: {len(catalog)} tools from cache in {elapsed * 1000:.1f} ms (saved {saved * 1000:.1f} ms)")
+            else:
+                tool_cache[server_name] = {
+                    "key": cache_key,
+                    "build_seconds": elapsed,
+                    "tools": catalog,
+                }
+                cache_dirty = True
+
+        if cache_dirty:
+            save_tool_cache(tool_cache)
+
+        # Check cached catalogs against the live servers without blocking startup
+        registry = (tools, input_schemas, name_to_tool)
+        revalidation_tasks = [
+            asyncio.create_task(revalidate_tool_catalog(*args, registry, on_catalog_change))
+            for args in revalidations
+        ]
+
+        async def cancel_revalidation():
+            for task in revalidation_tasks:
+                task.cancel()
+            await asyncio.gather(*revalidation_tasks, return_exceptions=True)
+
+        # Registered last so it runs before the sessions are closed
+        stack.push_async_callback(cancel_revalidation)
 
         print(f"✅ Successfully configured {len(tools)} tools")
+        if revalidations:
+            print(f"⚡ Tool cache saved ~{time_saved * 1000:.1f} ms of agent setup")
         return tools, input_schemas, name_to_tool, stack
 
     except Exception as e:
@@ -0,0 +1,313 @@
+# backend/workers.py
+import asyncio
+import bisect
+import hashlib
+import logging
+import multiprocessing as mp
+import queue
+import time
+import uuid
+
+from maintenance import MAINTENANCE_INTERVAL_SECONDS, prune_idle_states
+from utils import deep_sizeof
+
+logger = logging.getLogger(__name__)
+
+
+def _hash(value: str) -> int:
+    return int(hashlib.md5(value.encode()).hexdigest(), 16)
+
+
+class HashRing:
+    """Consistent hash ring mapping chat ids onto worker ids."""
+
+    def __init__(self, nodes, replicas: int = 64):
+        self._ring = sorted(
+            (_hash(f"{node}:{i}"), node) for node in nodes for i in range(replicas)
+        )
+        self._keys = [h for h, _ in self._ring]
+
+    def get(self, key: str):
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._ring[index][1]
+
+
+# ============= WORKER PROCESS =============
+
+def _worker_main(worker_id: int, requests, responses, active_tools):
+    """Entry point of a worker process: one ReAct_Agent and MCP stack per process."""
+    asyncio.run(_worker_loop(worker_id, requests, responses, active_tools))
+
+
+async def _worker_loop(worker_id: int, requests, responses, active_tools):
+    from agent import ReAct_Agent
+
+    agent = ReAct_Agent()
+    await agent.setup(active_tools)
+    responses.put(("ready", worker_id, None))
+
+    loop = asyncio.get_running_loop()
+    conversation_states = {}
+    last_seen = {}
+    chat_locks = {}
+    tasks = set()
+
+    async def prune_loop():
+        while True:
+            await asyncio.sleep(MAINTENANCE_INTERVAL_SECONDS)
+            pruned = prune_idle_states(conversation_states, last_seen)
+            for chat_id in [c for c in chat_locks if c not in conversation_states]:
+                if not chat_locks[chat_id].locked():
+                    del chat_locks[chat_id]
+            if pruned:
+                logger.info(f"🧹 Worker {worker_id} dropped {pruned} idle chat states")
+
+    pruner = asyncio.create_task(prune_loop())
+
+    async def handle(request_id, chat_id, query, timeout):
+        lock = chat_locks.setdefault(chat_id, asyncio.Lock())
+        async with lock:
+            state = conversation_states.setdefault(chat_id, {"messages": [], "logs": []})
+            last_seen[chat_id] = time.monotonic()
+            try:
+                result = await asyncio.wait_for(agent.process_query(query, state, chat_id=chat_id), timeout=timeout)
+            except asyncio.TimeoutError:
+                responses.put(("error", worker_id, (request_id, "Request timeout. Please try again.")))
+                return
+            except Exception as e:
+                responses.put(("error", worker_id, (request_id, str(e))))
+                return
+
+        conversation_states[chat_id] = result.get("state", state)
+        responses.put(("result", worker_id, (request_id, {
+            "response": result.get("response", "No response"),
+            "tool_called": result.get("tool_called"),
+            "logs": result.get("logs", []),
+            "budget": result.get("budget"),
+        })))
+
+    while True:
+        message = await loop.run_in_executor(None, requests.get)
+        if message is None:
+            break
+        if message[0] == "memory":
+            sizes = {chat_id: deep_sizeof(state) for chat_id, state in conversation_states.items()}
+            responses.put(("result", worker_id, (message[1], sizes)))
+            continue
+        task = asyncio.create_task(handle(*message))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    # Drain: finish everything already accepted before tearing down MCP
+    pruner.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+    await agent.cleanup()
+
+
+# ============= DISPATCHER =============
+
+class WorkerPool:
+    """Runs N agent worker processes and routes each chat_id to the same worker."""
+
+    def __init__(self, size: int, active_tools: list = None):
+        self.size = size
+        self.active_tools = active_tools
+        self.ring = HashRing(range(size))
+        self._ctx = mp.get_context("spawn")
+        self._responses = self._ctx.Queue()
+        self._workers = {}
+        self._pending = {}
+        self._control = {}
+        self._tasks = []
+        self._draining = False
+
+    def _spawn(self, worker_id: int):
+        requests = self._ctx.Queue()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, requests, self._responses, self.active_tools),
+            name=f"agent-worker-{worker_id}",
+            daemon=True,
+        )
+        process.start()
+
+        previous = self._workers.get(worker_id, {})
+        self._workers[worker_id] = {
+            "process": process,
+            "requests": requests,
+            "ready": False,
+            "started_at": time.time(),
+            "in_flight": 0,
+            "completed": 0,
+            "errors": 0,
+            "total_latency": 0.0,
+            "restarts": previous.get("restarts", -1) + 1,
+            "chats": previous.get("chats", set()),
+        }
+        logger.info(f"🚀 Started agent worker {worker_id} (pid {process.pid})")
+
+    async def start(self):
+        for worker_id in range(self.size):
+            self._spawn(worker_id)
+        self._tasks = [
+            asyncio.create_task(self._read_responses()),
+            asyncio.create_task(self._monitor()),
+        ]
+
+    async def submit(self, chat_id: str, query: str, timeout: float = 120):
+        """Run a query on the worker that owns chat_id."""
+        if self._draining:
+            raise RuntimeError("Worker pool is shutting down")
+
+        worker_id = self.ring.get(chat_id)
+        worker = self._workers[worker_id]
+        if not worker["process"].is_alive():
+            # Its request queue is replaced on respawn, so anything put there now is lost
+            raise RuntimeError(f"Agent worker {worker_id} is restarting; please try again shortly")
+
+        request_id = str(uuid.uuid4())
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = (worker_id, future, time.perf_counter())
+
+        worker["in_flight"] += 1
+        worker["chats"].add(chat_id)
+        try:
+            worker["requests"].put((request_id, chat_id, query, timeout))
+            # The worker enforces the timeout; this margin only guards against lost replies
+            return await asyncio.wait_for(future, timeout=timeout + 10)
+        finally:
+            # No-op when the reply arrived; otherwise releases the pending entry and in_flight slot
+            self._settle(request_id, error="No reply from agent worker")
+
+    def _settle(self, request_id: str, result=None, error: str = None):
+        entry = self._pending.pop(request_id, None)
+        if entry is None:
+            return
+        worker_id, future, started = entry
+        worker = self._workers[worker_id]
+        worker["in_flight"] = max(worker["in_flight"] - 1, 0)
+        worker["total_latency"] += time.perf_counter() - started
+
+        if error is None:
+            worker["completed"] += 1
+        else:
+            worker["errors"] += 1
+
+        if not future.done():
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(RuntimeError(error))
+
+    async def _read_responses(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                kind, worker_id, payload = await loop.run_in_executor(
+                    None, self._responses.get, True, 0.5
+                )
+            except queue.Empty:
+                if self._draining and not self._pending:
+                    return
+                continue
+
+            if kind == "ready":
+                self._workers[worker_id]["ready"] = True
+                logger.info(f"✅ Agent worker {worker_id} ready")
+            elif kind == "result":
+                request_id, result = payload
+                control = self._control.pop(request_id, None)
+                if control is not None:
+                    if not control.done():
+                        control.set_result(result)
+                else:
+                    self._settle(request_id, result=result)
+            elif kind == "error":
+                request_id, error = payload
+                self._settle(request_id, error=error)
+
+    async def _monitor(self):
+        while not self._draining:
+            await asyncio.sleep(1)
+            for worker_id, worker in list(self._workers.items()):
+                if worker["process"].is_alive() or self._draining:
+                    continue
+
+                logger.error(f"❌ Agent worker {worker_id} exited with code {worker['process'].exitcode}")
+                for request_id, (owner, _, _) in list(self._pending.items()):
+                    if owner == worker_id:
+                        self._settle(request_id, error="Agent worker crashed; conversation state was reset")
+
+                # Back off when a worker keeps dying during setup
+                uptime = time.time() - worker["started_at"]
+                if uptime < 10:
+                    await asyncio.sleep(min(2 ** worker["restarts"], 30))
+                worker["chats"] = set()
+                self._spawn(worker_id)
+
+    async def shutdown(self, timeout: float = 30):
+        """Stop accepting work, let in-flight requests finish, then stop workers."""
+        self._draining = True
+        for worker in self._workers.values():
+            worker["requests"].put(None)
+
+        deadline = time.monotonic() + timeout
+        while self._pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+
+        for worker in self._workers.values():
+            process = worker["process"]
+            await asyncio.get_running_loop().run_in_executor(
+                None, process.join, max(deadline - time.monotonic(), 1)
+            )
+            if process.is_alive():
+                process.terminate()
+
+        for request_id in list(self._pending):
+            self._settle(request_id, error="Agent worker pool shut down")
+        for task in self._tasks:
+            task.cancel()
+        logger.info("🧹 Agent worker pool stopped")
+
+    async def memory_report(self, timeout: float = 10) -> dict:
+        """Resident bytes of each worker's conversation states, keyed by worker id."""
+        loop = asyncio.get_running_loop()
+        futures = {}
+        report = {}
+        for worker_id, worker in self._workers.items():
+            if not worker["process"].is_alive():
+                report[worker_id] = None
+                continue
+            request_id = str(uuid.uuid4())
+            self._control[request_id] = loop.create_future()
+            futures[worker_id] = request_id
+            worker["requests"].put(("memory", request_id))
+
+        for worker_id, request_id in futures.items():
+            try:
+                report[worker_id] = await asyncio.wait_for(self._control[request_id], timeout=timeout)
+            except asyncio.TimeoutError:
+                report[worker_id] = None
+            finally:
+                self._control.pop(request_id, None)
+        return report
+
+    def stats(self) -> dict:
+        """Per-worker load report."""
+        workers = []
+        for worker_id, worker in sorted(self._workers.items()):
+            finished = worker["completed"] + worker["errors"]
+            workers.append({
+                "worker": worker_id,
+                "pid": worker["process"].pid,
+                "alive": worker["process"].is_alive(),
+                "ready": worker["ready"],
+                "in_flight": worker["in_flight"],
+                "completed": worker["completed"],
+                "errors": worker["errors"],
+                "restarts": worker["restarts"],
+                "chats": len(worker["chats"]),
+                "avg_latency_ms": round(worker["total_latency"] / finished * 1000, 1) if finished else None,
+            })
+        return {"size": self.size, "draining": self._draining, "workers": workers}
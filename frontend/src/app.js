@@ -6,7 +6,7 @@ import Login from './components/Login';
 import ForgotPassword from './components/ForgotPassword';
 import ResetPassword from './components/ResetPassword';
 import authService from './services/authService';
-import apiService from './services/authService';
+import apiService from './services/api';
 
 // Main Chat Component
 export default function CyberSecurityChat() {
@@ -60,8 +60,10 @@ export default function CyberSecurityChat() {
           id: chat.id,
           title: chat.title,
           messages: [],
-          timestamp: new Date(chat.created_at),
+          timestamp: new Date(chat.last_activity || chat.created_at),
           tools: chat.tools || [],
+          lastMessage: chat.last_message ? chat.last_message.snippet : '',
+          messageCount: chat.message_count || 0,
           created_at: chat.created_at,
           updated_at: chat.updated_at
         }));
@@ -92,6 +94,21 @@ export default function CyberSecurityChat() {
     }
   };
 
+  const loadMessagePayload = async (chatId, messageId) => {
+    try {
+      const result = await apiService.getMessage(chatId, messageId);
+      if (result.success) {
+        setChats(prevChats => prevChats.map(chat =>
+          chat.id === chatId
+            ? { ...chat, messages: chat.messages.map(m => m.id === messageId ? result.message : m) }
+            : chat
+        ));
+      }
+    } catch (error) {
+      console.error('Failed to load tool output:', error);
+    }
+  };
+
   const handleLoginSuccess = (userData) => {
     setUser(userData);
     setAuthView('login');
@@ -382,6 +399,9 @@ export default function CyberSecurityChat() {
                     <MessageSquare className="w-4 h-4 text-cyan-400 flex-shrink-0" />
                     <h3 className="text-sm font-medium truncate">{chat.title}</h3>
                   </div>
+                  {chat.lastMessage && (
+                    <p className="text-xs text-gray-400 truncate mb-1">{chat.lastMessage}</p>
+                  )}
                   <div className="flex items-center gap-2 text-xs text-gray-400">
                     <Clock className="w-3 h-3" />
                     <span>{formatTime(chat.timestamp)}</span>
@@ -535,7 +555,16 @@ export default function CyberSecurityChat() {
                           <div><span className="text-cyan-400">Tool_Args =</span> {JSON.stringify(msg.response.toolData.toolCall.args)}</div>
                           <div className="pt-3 border-t border-gray-700">
                             <span className="text-cyan-400">Content:</span>
-                            <pre className="mt-2 text-green-400 whitespace-pre-wrap leading-relaxed">{msg.response.toolData.output}</pre>
+                            {msg.payload_deferred ? (
+                              <button
+                                onClick={() => loadMessagePayload(currentChatId, msg.id)}
+                                className="mt-2 text-cyan-400 hover:text-cyan-300 underline"
+                              >
+                                Show full output ({Math.ceil(msg.payload_size / 1024)} KB)
+                              </button>
+                            ) : (
+                              <pre className="mt-2 text-green-400 whitespace-pre-wrap leading-relaxed">{msg.response.toolData.output}</pre>
+                            )}
                           </div>
                         </div>
                       </div>
@@ -117,6 +117,31 @@ class ApiService {
     }
   }
 
+  async getMessage(chatId, messageId) {
+    try {
+      const response = await fetch(`${API_URL}/api/chats/${chatId}/messages/${messageId}`, {
+        headers: {
+          ...authService.getAuthHeader()
+        }
+      });
+
+      if (response.status === 401) {
+        authService.logout();
+        window.location.href = '/';
+        throw new Error('Session expired. Please login again.');
+      }
+
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+
+      return await response.json();
+    } catch (error) {
+      console.error('API Error:', error);
+      throw error;
+    }
+  }
+
   async deleteChat(chatId) {
     try {
       const response = await fetch(`${API_URL}/api/chats/${chatId}`, {